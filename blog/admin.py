@@ -2,5 +2,22 @@ from django.contrib import admin
 
 from .models import Post, Category
 
-admin.site.register(Post)
-admin.site.register(Category)
+
+class SoftDeleteAdmin(admin.ModelAdmin):
+    """ 管理画面からの削除を論理削除に置き換える """
+
+    def delete_model(self, request, obj):
+        obj.soft_delete()
+
+    def delete_queryset(self, request, queryset):
+        queryset.soft_delete()
+
+    def get_deleted_objects(self, objs, request):
+        # 標準の実装は Collector で関連行を全件読み込むため、対象そのものだけを表示する
+        objs = list(objs)
+        model_count = {self.opts.verbose_name_plural: len(objs)}
+        return [str(obj) for obj in objs], model_count, set(), []
+
+
+admin.site.register(Post, SoftDeleteAdmin)
+admin.site.register(Category, SoftDeleteAdmin)
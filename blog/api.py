@@ -0,0 +1,237 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import ArchivedPost, Category, Post
+from .versions import CATEGORIES, POSTS, get_version
+
+POST_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'content': 'content',
+    'category': 'category_id',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+CATEGORY_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+}
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# BigAutoField(符号付き 64 ビット)に収まる ID の範囲
+MIN_ID = -2 ** 63
+MAX_ID = 2 ** 63 - 1
+
+
+class BadRequest(Exception):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    raw = json.dumps([created_at.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, pk = json.loads(raw)
+        created_at, pk = datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError, OverflowError):
+        raise BadRequest('Invalid cursor.')
+    if not MIN_ID <= pk <= MAX_ID:
+        raise BadRequest('Invalid cursor.')
+    return created_at, pk
+
+
+def parse_fields(request, allowed):
+    """ fields= で指定された列名を検証し、出力名のタプルで返す """
+    value = request.GET.get('fields')
+    if not value:
+        return tuple(allowed)
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',')))
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise BadRequest(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def parse_ids(request):
+    value = request.GET.get('ids')
+    if not value:
+        return None
+    try:
+        ids = [int(pk) for pk in value.split(',')]
+    except ValueError:
+        raise BadRequest('ids must be a comma separated list of integers.')
+    if len(ids) > MAX_LIMIT:
+        raise BadRequest(f'At most {MAX_LIMIT} ids can be fetched at once.')
+    if not all(MIN_ID <= pk <= MAX_ID for pk in ids):
+        raise BadRequest('ids must be 64-bit integers.')
+    return ids
+
+
+def parse_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest('limit must be an integer.')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def serialize_posts(queryset, fields, include_category):
+    """ モデルインスタンスを作らずに values_list の行から dict を組み立てる
+
+    カテゴリは JOIN で同じクエリから取得するため、行ごとの追加クエリは発生しない。
+    (created_at, id) はカーソル用に常に取得する。
+    """
+    columns = ['created_at', 'id'] + [POST_FIELDS[name] for name in fields]
+    if include_category:
+        columns += ['category_id', 'category__name']
+    rows = queryset.values_list(*columns)
+
+    items = []
+    keys = []
+    width = len(fields)
+    for row in rows:
+        item = dict(zip(fields, row[2:2 + width]))
+        if include_category:
+            category_id, category_name = row[-2:]
+            item['category'] = None if category_id is None else {
+                'id': category_id, 'name': category_name}
+        items.append(item)
+        keys.append(row[:2])
+    return items, keys
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _post_version(request, include_category):
+    """ 共有キャッシュにあるテーブルの版から ETag と Last-Modified を求める
+
+    DB を読まないので、304 を返すだけのリクエストはクエリを発行しない。
+    カテゴリを埋め込む場合はカテゴリの版も含める。
+    """
+    versions = [get_version(POSTS)]
+    if include_category:
+        versions.append(get_version(CATEGORIES))
+    key = '|'.join([request.get_full_path(), *map(str, versions)])
+    etag = f'"{hashlib.md5(key.encode()).hexdigest()}"'
+    return etag, max(versions) / 1e9
+
+
+def _conditional(request, etag, last_modified, build):
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build()
+    if response.status_code in (200, 304):
+        response.headers['ETag'] = etag
+        if last_modified:
+            response.headers['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def post_list(request):
+    """ 投稿一覧 API
+
+    ?fields=id,title  返す列の指定(指定した列だけを SELECT する)
+    ?ids=1,2,3        ID を指定して 1 クエリでまとめて取得
+                      (Post にない ID はアーカイブからもう 1 クエリで取得)
+    ?include=category カテゴリ名を JOIN して埋め込む
+    ?cursor=...&limit=100  (created_at, id) のキーセットによるページング
+    """
+    try:
+        fields = parse_fields(request, POST_FIELDS)
+        ids = parse_ids(request)
+        limit = parse_limit(request)
+        cursor = request.GET.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+    except BadRequest as e:
+        return _error(str(e))
+    include_category = 'category' in request.GET.get('include', '').split(',')
+
+    def build():
+        queryset = Post.objects.order_by('created_at', 'id')
+        if ids is not None:
+            items, keys = serialize_posts(
+                queryset.filter(id__in=ids), fields, include_category)
+            # 見つからなかった ID はアーカイブした記事から探す
+            missing = set(ids).difference(pk for created_at, pk in keys)
+            if missing:
+                archived, archived_keys = serialize_posts(
+                    ArchivedPost.objects.order_by('created_at', 'id').filter(
+                        id__in=missing), fields, include_category)
+                pairs = sorted(zip(keys + archived_keys, items + archived),
+                               key=lambda pair: pair[0])
+                items = [item for key, item in pairs]
+            return JsonResponse({'results': items})
+
+        if after is not None:
+            queryset = queryset.after(*after)
+        items, keys = serialize_posts(
+            queryset[:limit + 1], fields, include_category)
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(*keys[limit - 1])
+        return JsonResponse({'results': items, 'next': next_cursor})
+
+    etag, last_modified = _post_version(request, include_category)
+    return _conditional(request, etag, last_modified, build)
+
+
+def post_detail(request, pk):
+    if not MIN_ID <= pk <= MAX_ID:
+        return _error('Not found.', status=404)
+    try:
+        fields = parse_fields(request, POST_FIELDS)
+    except BadRequest as e:
+        return _error(str(e))
+    include_category = 'category' in request.GET.get('include', '').split(',')
+
+    def build():
+        items, _ = serialize_posts(
+            Post.objects.filter(pk=pk), fields, include_category)
+        if not items:
+            # アーカイブした記事も同じ URL で返す
+            items, _ = serialize_posts(
+                ArchivedPost.objects.filter(pk=pk), fields, include_category)
+        if not items:
+            return _error('Not found.', status=404)
+        return JsonResponse(items[0])
+
+    etag, last_modified = _post_version(request, include_category)
+    return _conditional(request, etag, last_modified, build)
+
+
+def category_list(request):
+    """ カテゴリ一覧 API
+
+    カテゴリは件数が少ないため、ETag は本文のハッシュから求める。
+    """
+    try:
+        fields = parse_fields(request, CATEGORY_FIELDS)
+        ids = parse_ids(request)
+    except BadRequest as e:
+        return _error(str(e))
+
+    queryset = Category.objects.order_by('id')
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    rows = queryset.values_list(*(CATEGORY_FIELDS[name] for name in fields))
+    response = JsonResponse(
+        {'results': [dict(zip(fields, row)) for row in rows]})
+    etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+    return _conditional(request, etag, None, lambda: response)
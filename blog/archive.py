@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedPost, Post
+from .navigation import refresh_oldest
+from .versions import POSTS, bump_version
+
+ARCHIVED_FIELDS = (
+    'id', 'title', 'content', 'category_id', 'created_at', 'updated_at')
+
+
+def archive_posts(older_than_days, batch_size=500, max_seconds=5.0, pause=0.05):
+    """ created_at が older_than_days 日より古い Post を ArchivedPost に移す
+
+    Post テーブルとその索引を、よく読まれる新しい記事だけの小さなものに保つ。
+    古い順に batch_size 件ずつ、1 バッチ 1 トランザクションでコピーと削除を行い、
+    max_seconds を超えたら打ち切る。論理削除された Post は purge_deleted に任せる。
+    移した件数を返す。
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deadline = time.monotonic() + max_seconds
+    candidates = Post.objects.filter(created_at__lt=cutoff).order_by(
+        'created_at', 'id')
+    archived = 0
+    while True:
+        # 読み出しも同じトランザクションで行い、読んでからコピーするまでの
+        # 間に更新された内容を失わないようにする
+        with transaction.atomic():
+            rows = list(candidates.values(*ARCHIVED_FIELDS)[:batch_size])
+            if not rows:
+                break
+            ArchivedPost.objects.bulk_create(
+                [ArchivedPost(**row) for row in rows])
+            Post.all_objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            bump_version(POSTS)
+        refresh_oldest({row['category_id'] for row in rows})
+        archived += len(rows)
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(pause)
+    return archived
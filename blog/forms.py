@@ -1,8 +1,28 @@
 from django import forms
+from django.core.validators import FileExtensionValidator
+
+from .images import IMAGE_EXTENSIONS, IMAGE_FORMATS, attach_image
 from .models import Post
 
 
 class PostForm(forms.ModelForm):
+    image = forms.ImageField(
+        required=False,
+        validators=[FileExtensionValidator(IMAGE_EXTENSIONS)])
+
     class Meta:
         model = Post
         fields = ["title", "content", "category"]
+
+    def clean_image(self):
+        image = self.cleaned_data.get("image")
+        if image and image.image.format not in IMAGE_FORMATS:
+            raise forms.ValidationError(
+                "Upload a JPEG, PNG, GIF or WebP image.")
+        return image
+
+    def save(self, commit=True):
+        post = super().save(commit)
+        if commit and self.cleaned_data.get("image"):
+            attach_image(post, self.cleaned_data["image"])
+        return post
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import PostImage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'gif', 'webp']
+
+# 受け付ける Pillow の画像形式と、保存するときの拡張子
+IMAGE_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+# 生成する派生画像の形式と、Pillow に渡す保存形式
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+
+
+def image_dir(sha256):
+    return Path('images') / sha256[:2] / sha256
+
+
+def attach_image(post, uploaded):
+    """ アップロードされた画像を内容のハッシュで保存し、記事に添付する
+
+    ファイルはチャンクごとにハッシュを計算しながらディスクに書き出すので、
+    全体をメモリに載せることはない。同じ内容の画像が既にあればファイルは共有し、
+    サムネイルが生成済みならその情報を引き継ぐ。
+    """
+    media_root = Path(settings.MEDIA_ROOT)
+    tmp_dir = media_root / 'images' / 'tmp'
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = tmp_dir / uuid.uuid4().hex
+
+    # 書き出しの途中で失敗しても一時ファイルを残さない
+    try:
+        digest = hashlib.sha256()
+        with open(tmp_path, 'wb') as f:
+            for chunk in uploaded.chunks():
+                digest.update(chunk)
+                f.write(chunk)
+        sha256 = digest.hexdigest()
+
+        # ImageField で検証済みなら、ファイル名ではなく実際の形式から拡張子を決める
+        image_format = getattr(getattr(uploaded, 'image', None), 'format', None)
+        ext = (IMAGE_FORMATS.get(image_format)
+               or os.path.splitext(uploaded.name)[1].lower() or '.bin')
+        original = image_dir(sha256) / f'original{ext}'
+        if not (media_root / original).exists():
+            (media_root / original).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, media_root / original)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    image = PostImage(post_id=post.pk, sha256=sha256, original=original.as_posix())
+    done = PostImage.objects.filter(
+        sha256=sha256, status=PostImage.READY).first()
+    if done is not None:
+        image.width = done.width
+        image.height = done.height
+        image.variants = done.variants
+        image.status = PostImage.READY
+    image.save()
+    return image
+
+
+def render_variants(media_root, original, sha256, widths, quality):
+    """ 派生画像を生成する。ProcessPoolExecutor の子プロセスで実行される """
+    from PIL import Image, ImageOps
+
+    media_root = Path(media_root)
+    out_dir = image_dir(sha256)
+    variants = []
+    with Image.open(media_root / original) as source:
+        source = ImageOps.exif_transpose(source)
+        width, height = source.size
+        targets = sorted({w for w in widths if w < width} | {min(width, max(widths))})
+        for target in targets:
+            resized = source.copy()
+            resized.thumbnail((target, round(height * target / width)),
+                              Image.LANCZOS)
+            for ext, fmt in VARIANT_FORMATS.items():
+                image = resized if fmt == 'WEBP' else resized.convert('RGB')
+                path = out_dir / f'{target}.{ext}'
+                image.save(media_root / path, fmt, quality=quality)
+                variants.append({
+                    'width': resized.width,
+                    'height': resized.height,
+                    'format': ext,
+                    'path': path.as_posix(),
+                })
+    return {'width': width, 'height': height, 'variants': variants}
+
+
+def build_pending_thumbnails(workers=None, limit=100):
+    """ サムネイル未生成の画像をプロセスプールでまとめて処理する
+
+    同じハッシュの画像は 1 回だけ処理し、結果を全ての行に書き込む。
+    処理した画像(ハッシュ)の数を返す。
+    """
+    pending = dict(
+        PostImage.objects.filter(status=PostImage.PENDING)
+        .values_list('sha256', 'original')[:limit])
+    if not pending:
+        return 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                render_variants, str(settings.MEDIA_ROOT), original, sha256,
+                settings.IMAGE_VARIANT_WIDTHS, settings.IMAGE_VARIANT_QUALITY,
+            ): sha256
+            for sha256, original in pending.items()}
+        for future in as_completed(futures):
+            sha256 = futures[future]
+            images = PostImage.objects.filter(sha256=sha256)
+            try:
+                result = future.result()
+            except Exception:
+                logger.exception('Could not build thumbnails for %s', sha256)
+                images.update(status=PostImage.FAILED)
+                continue
+            images.update(status=PostImage.READY, **result)
+    return len(pending)
+
+
+def remove_unused_images(sha256s):
+    """ どの PostImage からも参照されなくなった画像のディレクトリを削除する
+
+    sha256s は行を削除した画像のハッシュ。原本と派生画像をまとめて
+    images/<xx>/<sha256>/ ごと消す。削除したディレクトリの数を返す。
+    """
+    used = set(PostImage.objects.filter(sha256__in=set(sha256s)).values_list(
+        'sha256', flat=True))
+    media_root = Path(settings.MEDIA_ROOT)
+    removed = 0
+    for sha256 in set(sha256s) - used:
+        path = media_root / image_dir(sha256)
+        if path.is_dir():
+            shutil.rmtree(path)
+            removed += 1
+    return removed
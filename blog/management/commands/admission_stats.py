@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myblog.middleware import admission_counters
+
+
+class Command(BaseCommand):
+    help = "Show how many write requests were admitted or shed by all workers."
+
+    def handle(self, *args, **options):
+        for outcome, count in admission_counters().items():
+            self.stdout.write(f"{outcome:<12}{count:>10}")
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...archive import archive_posts
+
+
+class Command(BaseCommand):
+    help = "Move posts older than ARCHIVE_AFTER_DAYS into the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=settings.ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--max-seconds', type=float, default=5.0,
+            help="Stop after this many seconds; run again to continue.")
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help="Seconds to sleep between batches so other writers can run.")
+
+    def handle(self, *args, **options):
+        archived = archive_posts(
+            options['older_than_days'],
+            batch_size=options['batch_size'],
+            max_seconds=options['max_seconds'],
+            pause=options['pause'])
+        self.stdout.write(f"Archived {archived} post(s).")
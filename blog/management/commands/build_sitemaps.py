@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from ...sitemaps import build_sitemaps
+
+
+class Command(BaseCommand):
+    help = "Write the sitemap index and its shards to SITEMAP_ROOT."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'base_url', help="Site root used in <loc>, e.g. https://example.com")
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Rewrite every shard even if it has not changed.")
+
+    def handle(self, *args, **options):
+        written = build_sitemaps(options['base_url'], force=options['force'])
+        self.stdout.write(f"Rewrote {len(written)} shard(s): {written}")
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...images import build_pending_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Build thumbnails and WebP variants for uploaded images in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help="Number of worker processes (defaults to the CPU count).")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--watch', type=float, default=None, metavar='SECONDS',
+            help="Keep running and poll for new uploads every SECONDS.")
+
+    def handle(self, *args, **options):
+        while True:
+            count = build_pending_thumbnails(
+                workers=options['workers'], limit=options['batch_size'])
+            if count:
+                self.stdout.write(f"Processed {count} image(s).")
+            elif options['watch'] is None:
+                return
+            else:
+                time.sleep(options['watch'])
@@ -0,0 +1,68 @@
+import multiprocessing
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'myblog.cache.SQLiteCache',
+}
+
+
+def run_worker(backend, location, options, seed):
+    """ 読み込み 9 割・書き込み 1 割で、ミス時は値を作って保存する """
+    cache = import_string(BACKENDS[backend])(
+        location, {'OPTIONS': {'MAX_ENTRIES': options['keys'] * 2}})
+    rng = random.Random(seed)
+    value = 'x' * options['value_size']
+    hits = reads = 0
+    started = time.perf_counter()
+    for _ in range(options['ops']):
+        key = f"key{rng.randrange(options['keys'])}"
+        if rng.random() < 0.1:
+            cache.set(key, value)
+            continue
+        reads += 1
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, value)
+    return options['ops'] / (time.perf_counter() - started), hits, reads
+
+
+class Command(BaseCommand):
+    help = ("Compare LocMem, file-based and SQLite caches with several "
+            "processes sharing one key space.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--ops', type=int, default=5000)
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument('--value-size', type=int, default=1024)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(
+            f"{'backend':<8}{'ops/s per proc':>16}{'total ops/s':>14}"
+            f"{'hit rate':>10}")
+        for backend in BACKENDS:
+            with tempfile.TemporaryDirectory() as tmp:
+                location = Path(tmp) / backend
+                if backend == 'sqlite':
+                    # テーブルの作成を先に済ませ、計測に含めない
+                    import_string(BACKENDS[backend])(location, {}).get('warmup')
+                with context.Pool(options['processes']) as pool:
+                    results = pool.starmap(run_worker, [
+                        (backend, location, options, seed)
+                        for seed in range(options['processes'])])
+            rates = [rate for rate, hits, reads in results]
+            hits = sum(hits for rate, hits, reads in results)
+            reads = sum(reads for rate, hits, reads in results)
+            self.stdout.write(
+                f"{backend:<8}{sum(rates) / len(rates):>16.0f}"
+                f"{sum(rates):>14.0f}{hits / reads:>10.1%}")
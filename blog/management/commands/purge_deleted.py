@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from ...purge import purge_deleted
+
+
+class Command(BaseCommand):
+    help = "Physically delete soft-deleted posts and categories in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--max-seconds', type=float, default=5.0,
+            help="Stop after this many seconds; run again to continue.")
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help="Seconds to sleep between batches so other writers can run.")
+
+    def handle(self, *args, **options):
+        purged = purge_deleted(
+            batch_size=options['batch_size'],
+            max_seconds=options['max_seconds'],
+            pause=options['pause'])
+        self.stdout.write(
+            f"Purged {purged['posts']} post(s) and "
+            f"{purged['categories']} category(ies).")
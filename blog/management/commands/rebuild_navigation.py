@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ...navigation import rebuild_navigation
+
+
+class Command(BaseCommand):
+    help = "Recompute previous/next and related posts for every post."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuild_navigation(batch_size=options['batch_size'])
+        self.stdout.write("Navigation rebuilt.")
@@ -0,0 +1,93 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# 子プロセスで myblog.wsgi を読み込み、フォークしたワーカーで最初のリクエストを処理する
+PROBE = r'''
+import json, os, sys, time
+from wsgiref.util import setup_testing_defaults
+
+
+def read_kb(path, keys):
+    try:
+        with open(path) as f:
+            return sum(int(line.split()[1]) for line in f
+                       if line.split(':')[0] in keys)
+    except OSError:
+        return None
+
+
+started = time.perf_counter()
+from myblog.wsgi import application
+loaded = time.perf_counter()
+
+environ = {}
+setup_testing_defaults(environ)
+environ['PATH_INFO'] = sys.argv[1]
+read_fd, write_fd = os.pipe()
+pid = os.fork()
+if pid == 0:
+    began = time.perf_counter()
+    response = application(environ, lambda status, headers, exc_info=None: None)
+    b''.join(response)
+    response.close()
+    result = {
+        'first_request': time.perf_counter() - began,
+        'worker_private_kb': read_kb(
+            '/proc/self/smaps_rollup', ('Private_Clean', 'Private_Dirty')),
+    }
+    os.write(write_fd, json.dumps(result).encode())
+    os._exit(0)
+os.close(write_fd)
+child = json.loads(os.read(read_fd, 65536))
+os.waitpid(pid, 0)
+print(json.dumps({
+    'import': loaded - started,
+    'master_rss_kb': read_kb('/proc/self/status', ('VmRSS',)),
+    **child,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = ("Measure WSGI import time, first-request latency and per-worker "
+            "private memory with and without the startup warm-up.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/')
+
+    def probe(self, warmup, path):
+        env = dict(os.environ, DJANGO_WARMUP='1' if warmup else '0')
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE, path],
+            cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True).stdout
+        return json.loads(output.splitlines()[-1])
+
+    def handle(self, *args, **options):
+        if not hasattr(os, 'fork'):
+            raise CommandError("This benchmark needs os.fork().")
+
+        self.stdout.write(
+            f"{'mode':<6}{'import ms':>12}{'1st req ms':>12}"
+            f"{'master RSS KB':>15}{'worker private KB':>19}")
+        for warmup in (False, True):
+            results = [self.probe(warmup, options['path'])
+                       for _ in range(options['runs'])]
+
+            def median(key):
+                values = [r[key] for r in results if r[key] is not None]
+                return statistics.median(values) if values else float('nan')
+
+            self.stdout.write(
+                f"{'warm' if warmup else 'cold':<6}"
+                f"{median('import') * 1000:>12.1f}"
+                f"{median('first_request') * 1000:>12.1f}"
+                f"{median('master_rss_kb'):>15.0f}"
+                f"{median('worker_private_kb'):>19.0f}")
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-19 02:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='next_post',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='blog.post'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='previous_post',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='blog.post'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='related_post_ids',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['category', 'created_at', 'id'], name='blog_post_category_idx'),
+        ),
+    ]
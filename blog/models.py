@@ -1,13 +1,121 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+
+class CategoryQuerySet(models.QuerySet):
+
+    def soft_delete(self):
+        from .navigation import category_links, unlink
+        from .versions import CATEGORIES, POSTS, bump_version
+
+        # 配下の Post は見えなくなるので、その前後の Post をつなぎ直す
+        with transaction.atomic(using=self.db):
+            links = category_links(self)
+            count = self.update(deleted_at=timezone.now())
+            unlink(links)
+        bump_version(CATEGORIES, POSTS)
+        return count
+
+
+class LiveCategoryManager(models.Manager.from_queryset(CategoryQuerySet)):
+    """ 論理削除されていないカテゴリだけを返す """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Category(models.Model):
     name = models.CharField(max_length=100, null=False)
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    objects = LiveCategoryManager()
+    all_objects = CategoryQuerySet.as_manager()
+
+    def soft_delete(self):
+        """ 論理削除する
+
+        配下の Post は書き換えず、読み出し時にカテゴリの削除状態で除外する。
+        実際の行の削除は purge_deleted コマンドが少しずつ行う。
+        """
+        from .navigation import category_links, unlink
+        from .versions import POSTS, bump_version
+
+        with transaction.atomic():
+            links = category_links([self])
+            self.deleted_at = timezone.now()
+            self.save(update_fields=['deleted_at'])
+            unlink(links)
+        bump_version(POSTS)
 
     def __str__(self):
         return self.name
 
 
+class KeysetQuerySet(models.QuerySet):
+    """ (created_at, id) の並びのキーセットで絞り込む。Post と ArchivedPost で使う """
+
+    # created_at の範囲条件を OR の外にも置くと、SQLite は OR を含む条件でも
+    # (created_at, id) の索引をキーの位置から読み始められる
+
+    def after(self, created_at, pk):
+        """ (created_at, id) の順でキーより後ろの行に絞り込む """
+        return self.filter(
+            models.Q(created_at__gt=created_at)
+            | models.Q(created_at=created_at, id__gt=pk),
+            created_at__gte=created_at)
+
+    def before(self, created_at, pk):
+        """ (created_at, id) の順でキーより前の行に絞り込む """
+        return self.filter(
+            models.Q(created_at__lt=created_at)
+            | models.Q(created_at=created_at, id__lt=pk),
+            created_at__lte=created_at)
+
+    def since(self, created_at, pk):
+        """ (created_at, id) の順でキー以降(キーを含む)の行に絞り込む """
+        return self.filter(
+            models.Q(created_at__gt=created_at)
+            | models.Q(created_at=created_at, id__gte=pk),
+            created_at__gte=created_at)
+
+    def up_to(self, created_at, pk):
+        """ (created_at, id) の順でキー以前(キーを含む)の行に絞り込む """
+        return self.filter(
+            models.Q(created_at__lt=created_at)
+            | models.Q(created_at=created_at, id__lte=pk),
+            created_at__lte=created_at)
+
+
+class PostQuerySet(KeysetQuerySet):
+
+    def soft_delete(self):
+        from .navigation import refresh_around
+        from .versions import POSTS, bump_version
+
+        with transaction.atomic(using=self.db):
+            rows = list(self.filter(
+                deleted_at__isnull=True, category__deleted_at__isnull=True,
+            ).values_list('created_at', 'id', 'category_id',
+                          'previous_post_id', 'next_post_id'))
+            now = timezone.now()
+            count = self.update(deleted_at=now, updated_at=now)
+            refresh_around(rows)
+        bump_version(POSTS)
+        return count
+
+
+class LivePostManager(models.Manager.from_queryset(PostQuerySet)):
+    """ 論理削除されていない Post だけを返す
+
+    Post 自身か、所属するカテゴリが論理削除されているものを除外する。
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(
+            deleted_at__isnull=True, category__deleted_at__isnull=True)
+
+
 class Post(models.Model):
     title = models.CharField(max_length=200, null=False, blank=False)
     content = models.TextField()
@@ -15,6 +123,136 @@ class Post(models.Model):
         Category, null=True, blank=True, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # 前後の記事と同じカテゴリの近い記事。blog.navigation が書き込み時に更新する
+    previous_post = models.ForeignKey(
+        'self', null=True, blank=True, editable=False,
+        on_delete=models.SET_NULL, related_name='+')
+    next_post = models.ForeignKey(
+        'self', null=True, blank=True, editable=False,
+        on_delete=models.SET_NULL, related_name='+')
+    related_post_ids = models.JSONField(default=list, blank=True, editable=False)
+
+    objects = LivePostManager()
+    all_objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='blog_post_created_id_idx'),
+            models.Index(fields=['category', 'created_at', 'id'],
+                         name='blog_post_category_idx'),
+            # 削除済みの行だけを持つ部分索引。公開中の一覧の並び替えには
+            # 使われず、purge が削除済みの行を探すときだけ使われる
+            models.Index(fields=['deleted_at'], name='blog_post_deleted_idx',
+                         condition=models.Q(deleted_at__isnull=False)),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # カテゴリの変更と論理削除を保存時に検知できるよう、読み込み時の値を覚えておく
+        if 'category_id' in field_names:
+            instance._loaded_category_id = values[field_names.index('category_id')]
+        if 'deleted_at' in field_names:
+            instance._loaded_deleted_at = values[field_names.index('deleted_at')]
+        return instance
+
+    def save(self, *args, **kwargs):
+        # post_save で行う前後の記事の更新を同じトランザクションに入れ、
+        # 同時に作成された Post と並びの計算が食い違わないようにする
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
+
+    def soft_delete(self):
+        """ 論理削除する。delete() は従来どおり物理削除を行う """
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at', 'updated_at'])
+
+
+class LiveArchivedPostManager(models.Manager.from_queryset(KeysetQuerySet)):
+    """ 論理削除されたカテゴリに属するものを除外する """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(category__deleted_at__isnull=True)
+
+
+class ArchivedPost(models.Model):
+    """ archive_posts コマンドで Post テーブルから移された古い記事
+
+    ID は元の Post のものを引き継ぐので、記事の URL は変わらない。
+    """
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    content = models.TextField()
+    category = models.ForeignKey(
+        Category, null=True, blank=True, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = LiveArchivedPostManager()
+    all_objects = KeysetQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'],
+                         name='blog_archive_created_id_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class PostImage(models.Model):
+    """ 記事の添付画像
+
+    ファイルは内容の SHA-256 ごとに保存し、同じ画像は複数の記事で共有する。
+    サムネイルと WebP の派生画像は build_thumbnails コマンドが生成し、
+    その寸法とパスを variants に保存する。
+    """
+    PENDING = 'pending'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    ]
+
+    # アーカイブした記事も同じ ID で画像を引けるよう、外部キー制約は張らない
+    post = models.ForeignKey(
+        Post, on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='images')
+    sha256 = models.CharField(max_length=64, db_index=True)
+    original = models.CharField(max_length=255)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    variants = models.JSONField(default=list, blank=True)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def _srcset(self, ext):
+        return ', '.join(
+            f"{settings.MEDIA_URL}{variant['path']} {variant['width']}w"
+            for variant in self.variants if variant['format'] == ext)
+
+    @property
+    def webp_srcset(self):
+        return self._srcset('webp')
+
+    @property
+    def jpg_srcset(self):
+        return self._srcset('jpg')
+
+    @property
+    def fallback_url(self):
+        """ srcset に対応しないブラウザ向けの、最も大きい JPEG """
+        jpegs = [v for v in self.variants if v['format'] == 'jpg']
+        if not jpegs:
+            return ''
+        return settings.MEDIA_URL + max(jpegs, key=lambda v: v['width'])['path']
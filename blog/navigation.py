@@ -0,0 +1,276 @@
+from bisect import bisect_left
+
+from .models import Category, Post
+
+# 同じカテゴリで前後それぞれ何件を関連記事にするか
+RELATED_POSTS = 2
+
+NAVIGATION_FIELDS = ['previous_post', 'next_post', 'related_post_ids']
+
+
+def _ordered(queryset):
+    return queryset.values_list('id', flat=True)
+
+
+def neighbours(created_at, pk, category_id=None, count=1, in_category=False):
+    """ (created_at, id) の並びでキーの前後にある Post の ID を返す
+
+    in_category が真なら category_id のカテゴリ内の並び
+    ((category, created_at, id) の索引)を使う。キー自身の Post は含まない。
+    """
+    queryset = Post.objects.all()
+    if in_category:
+        queryset = queryset.filter(category_id=category_id)
+    before = _ordered(queryset.before(created_at, pk).order_by(
+        '-created_at', '-id'))[:count]
+    after = _ordered(queryset.after(created_at, pk).order_by(
+        'created_at', 'id'))[:count]
+    return list(before), list(after)
+
+
+def compute_navigation(post):
+    before, after = neighbours(post.created_at, post.pk)
+    related = []
+    if post.category_id is not None:
+        cat_before, cat_after = neighbours(
+            post.created_at, post.pk, post.category_id,
+            count=RELATED_POSTS, in_category=True)
+        related = cat_before[::-1] + cat_after
+    return {
+        'previous_post_id': before[0] if before else None,
+        'next_post_id': after[0] if after else None,
+        'related_post_ids': related,
+    }
+
+
+def refresh_navigation(pks):
+    """ 指定した Post の前後・関連記事を計算し直して保存する """
+    posts = list(Post.objects.filter(pk__in=pks).only(
+        'id', 'created_at', 'category_id'))
+    for post in posts:
+        for attname, value in compute_navigation(post).items():
+            setattr(post, attname, value)
+    Post.objects.bulk_update(posts, NAVIGATION_FIELDS)
+
+
+def _keys(queryset):
+    return queryset.values_list('created_at', 'id')
+
+
+def window(queryset, keys, margin):
+    """ (created_at, id) の並びで、keys の最小から最大までとその前後 margin 件のキーを返す
+
+    前後が margin 件に満たなければ、そちら側は並びの端まで読めている。
+    """
+    lo, hi = min(keys), max(keys)
+    before = _keys(queryset.before(*lo).order_by('-created_at', '-id'))[:margin]
+    middle = _keys(queryset.since(*lo).up_to(*hi).order_by('created_at', 'id'))
+    after = _keys(queryset.after(*hi).order_by('created_at', 'id'))[:margin]
+    return list(before)[::-1] + list(middle) + list(after)
+
+
+def near(rows, keys, distance):
+    """ rows の中で keys の位置から distance 件以内にある行の位置を返す """
+    positions = set()
+    for key in keys:
+        i = bisect_left(rows, key)
+        found = i < len(rows) and rows[i] == key
+        positions.update(range(
+            max(0, i - distance), min(len(rows), i + distance + found)))
+    return sorted(positions)
+
+
+def link_around(keys):
+    """ 並びに加わった (created_at, id) の Post とその前後の Post の前後の記事を更新する
+
+    周りのキーを 3 クエリで読み、前後の記事はその中で求める。
+    """
+    rows = window(Post.objects.all(), keys, margin=2)
+    Post.objects.bulk_update([
+        Post(id=rows[i][1],
+             previous_post_id=rows[i - 1][1] if i > 0 else None,
+             next_post_id=rows[i + 1][1] if i + 1 < len(rows) else None)
+        for i in near(rows, keys, 1)], ['previous_post', 'next_post'])
+
+
+def unlink(links):
+    """ 並びから取り除かれた Post の前後の Post を、互いを指すようにつなぎ直す
+
+    links は取り除かれた Post の {id: (previous_post_id, next_post_id)}。
+    保存されている前後の記事をたどるので、DB の並びは読まない。
+    続けて取り除かれた Post は飛ばし、その先の残っている Post までたどる。
+    """
+    new_next = {}
+    new_previous = {}
+    for preceding, following in links.values():
+        while preceding in links:
+            preceding = links[preceding][0]
+        while following in links:
+            following = links[following][1]
+        if preceding is not None:
+            new_next[preceding] = following
+        if following is not None:
+            new_previous[following] = preceding
+    Post.objects.bulk_update(
+        [Post(id=pk, next_post_id=value) for pk, value in new_next.items()],
+        ['next_post'])
+    Post.objects.bulk_update(
+        [Post(id=pk, previous_post_id=value)
+         for pk, value in new_previous.items()],
+        ['previous_post'])
+
+
+def category_links(categories):
+    """ カテゴリに属する表示中の Post の {id: (previous_post_id, next_post_id)}
+
+    カテゴリを論理削除する前に読んでおき、削除後に unlink に渡す。
+    """
+    return {
+        pk: (preceding, following)
+        for pk, preceding, following in Post.objects.filter(
+            category__in=categories).values_list(
+                'id', 'previous_post_id', 'next_post_id')}
+
+
+def relate_around(keys_by_category):
+    """ カテゴリごとの並びで、キーの位置の周りの Post の関連記事を更新する
+
+    keys_by_category は {category_id: [(created_at, id), ...]}。
+    カテゴリごとに周りのキーを 3 クエリで読み、関連記事はその中で求める。
+    """
+    posts = []
+    for category_id, keys in keys_by_category.items():
+        if category_id is None:
+            continue
+        rows = window(Post.objects.filter(category_id=category_id), keys,
+                      margin=2 * RELATED_POSTS)
+        for i in near(rows, keys, RELATED_POSTS):
+            related = (rows[max(0, i - RELATED_POSTS):i]
+                       + rows[i + 1:i + 1 + RELATED_POSTS])
+            posts.append(Post(
+                id=rows[i][1],
+                related_post_ids=[pk for created_at, pk in related]))
+    Post.objects.bulk_update(posts, ['related_post_ids'])
+
+
+def refresh_around(rows):
+    """ 並びから取り除かれた Post の周りの Post を更新する
+
+    rows は (created_at, id, category_id, previous_post_id, next_post_id) の並び。
+    一括の論理削除など、その Post 自身の保存を伴わない変更の後に、
+    同じトランザクションの中で呼ぶ。
+    """
+    unlink({pk: (preceding, following)
+            for created_at, pk, category_id, preceding, following in rows})
+    keys_by_category = {}
+    for created_at, pk, category_id, preceding, following in rows:
+        keys_by_category.setdefault(category_id, []).append((created_at, pk))
+    relate_around(keys_by_category)
+
+
+def refresh_oldest(category_ids):
+    """ 全体と各カテゴリの並びで先頭付近の Post を更新する
+
+    古い方から Post を取り除いた(アーカイブした)後に呼ぶ。
+    """
+    pks = set(_ordered(Post.objects.order_by('created_at', 'id'))[:1])
+    for category_id in category_ids:
+        if category_id is not None:
+            oldest = Post.objects.filter(category_id=category_id).order_by(
+                'created_at', 'id')
+            pks.update(_ordered(oldest)[:RELATED_POSTS])
+    refresh_navigation(pks)
+
+
+def on_post_saved(post, created):
+    """ Post の保存後に、その Post と並びの上で隣接する Post を更新する
+
+    作成・カテゴリの変更・論理削除のときだけ更新する。
+    カテゴリの変更では、移動元と移動先の両方のカテゴリで隣接する Post が対象になる。
+    Post.save() のトランザクションの中で呼ばれるので、同時の書き込みとは競合しない。
+    """
+    old_category_id = getattr(post, '_loaded_category_id', post.category_id)
+    was_deleted = getattr(post, '_loaded_deleted_at', None) is not None
+    key = (post.created_at, post.pk)
+    if post.deleted_at is not None:
+        if not was_deleted:
+            # 読み込み後に前後の記事が変わっていることがあるので、保存されている値を使う
+            links = Post.all_objects.filter(pk=post.pk).values_list(
+                'previous_post_id', 'next_post_id').get()
+            refresh_around([(*key, old_category_id, *links)])
+    elif created:
+        link_around([key])
+        relate_around({post.category_id: [key]})
+    elif old_category_id != post.category_id:
+        relate_around({old_category_id: [key], post.category_id: [key]})
+        if post.category_id is None:
+            Post.objects.filter(pk=post.pk).update(related_post_ids=[])
+    post._loaded_category_id = post.category_id
+    post._loaded_deleted_at = post.deleted_at
+
+
+def get_navigation(post):
+    """ 詳細ページ用の前後・関連記事を 1 クエリで取得する """
+    ids = [post.previous_post_id, post.next_post_id, *post.related_post_ids]
+    ids = [pk for pk in ids if pk is not None]
+    titles = dict(Post.objects.filter(pk__in=ids).values_list('id', 'title'))
+
+    def link(pk):
+        return {'id': pk, 'title': titles[pk]} if pk in titles else None
+
+    return {
+        'previous_post': link(post.previous_post_id),
+        'next_post': link(post.next_post_id),
+        'related_posts': [
+            link(pk) for pk in post.related_post_ids if pk in titles],
+    }
+
+
+def rebuild_navigation(batch_size=1000):
+    """ 全ての Post の前後・関連記事を作り直す
+
+    全体の並びと各カテゴリの並びをキーセットで 1 回ずつ走査する。
+    """
+    def iter_ids(queryset):
+        after = None
+        while True:
+            chunk = queryset.order_by('created_at', 'id')
+            if after is not None:
+                chunk = chunk.after(*after)
+            rows = list(chunk.values_list('created_at', 'id')[:batch_size])
+            yield from (pk for created_at, pk in rows)
+            if len(rows) < batch_size:
+                return
+            after = rows[-1]
+
+    def save(posts, fields):
+        Post.objects.bulk_update(posts, fields, batch_size=batch_size)
+
+    posts = []
+    previous = current = None
+    for pk in iter_ids(Post.objects.all()):
+        if current is not None:
+            posts.append(Post(
+                id=current, previous_post_id=previous, next_post_id=pk))
+        previous, current = current, pk
+        if len(posts) >= batch_size:
+            save(posts, ['previous_post', 'next_post'])
+            posts = []
+    if current is not None:
+        posts.append(Post(
+            id=current, previous_post_id=previous, next_post_id=None))
+    save(posts, ['previous_post', 'next_post'])
+
+    posts = []
+    categories = Category.objects.values_list('id', flat=True)
+    for category_id in categories:
+        ids = list(iter_ids(Post.objects.filter(category_id=category_id)))
+        for i, pk in enumerate(ids):
+            related = (ids[max(0, i - RELATED_POSTS):i]
+                       + ids[i + 1:i + 1 + RELATED_POSTS])
+            posts.append(Post(id=pk, related_post_ids=related))
+            if len(posts) >= batch_size:
+                save(posts, ['related_post_ids'])
+                posts = []
+    save(posts, ['related_post_ids'])
+    Post.objects.filter(category__isnull=True).update(related_post_ids=[])
@@ -0,0 +1,79 @@
+import time
+
+from django.db import transaction
+from django.db.models import Q
+
+from .images import remove_unused_images
+from .models import ArchivedPost, Category, Post, PostImage
+from .navigation import refresh_navigation
+
+
+def delete_images(post_ids):
+    """ 記事の PostImage の行を削除し、その画像のハッシュを返す """
+    images = PostImage.objects.filter(post_id__in=post_ids)
+    sha256s = set(images.values_list('sha256', flat=True))
+    images.delete()
+    return sha256s
+
+
+def purge_deleted(batch_size=500, max_seconds=5.0, pause=0.05):
+    """ 論理削除された行を小さなバッチで物理削除する
+
+    1 バッチごとに短いトランザクションを切り、バッチの間に pause 秒待つことで、
+    SQLite の書き込みロックを長時間保持しないようにする。
+    max_seconds を超えた時点で打ち切るので、定期的に繰り返し実行すること。
+    どの記事からも参照されなくなった画像のファイルも削除する。
+    削除した件数を {'posts': n, 'categories': n} で返す。
+    """
+    deadline = time.monotonic() + max_seconds
+    purged = {'posts': 0, 'categories': 0}
+
+    dead_posts = Post.all_objects.filter(
+        Q(deleted_at__isnull=False) | Q(category__deleted_at__isnull=False))
+    while True:
+        pks = list(dead_posts.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        # カテゴリごと論理削除された Post を前後の記事として指している Post
+        referrers = list(Post.objects.filter(
+            Q(previous_post__in=pks) | Q(next_post__in=pks)
+        ).values_list('pk', flat=True))
+        with transaction.atomic():
+            sha256s = delete_images(pks)
+            Post.all_objects.filter(pk__in=pks).delete()
+        remove_unused_images(sha256s)
+        refresh_navigation(referrers)
+        purged['posts'] += len(pks)
+        if time.monotonic() >= deadline:
+            return purged
+        time.sleep(pause)
+
+    dead_archived_posts = ArchivedPost.all_objects.filter(
+        category__deleted_at__isnull=False)
+    while True:
+        pks = list(dead_archived_posts.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        with transaction.atomic():
+            sha256s = delete_images(pks)
+            ArchivedPost.all_objects.filter(pk__in=pks).delete()
+        remove_unused_images(sha256s)
+        purged['posts'] += len(pks)
+        if time.monotonic() >= deadline:
+            return purged
+        time.sleep(pause)
+
+    # 配下の Post がすべて消えたカテゴリだけを削除する
+    dead_categories = Category.all_objects.filter(
+        deleted_at__isnull=False, post__isnull=True, archivedpost__isnull=True)
+    while True:
+        pks = list(dead_categories.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        with transaction.atomic():
+            Category.all_objects.filter(pk__in=pks).delete()
+        purged['categories'] += len(pks)
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(pause)
+    return purged
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Category, Post
+from .navigation import on_post_saved
+from .versions import CATEGORIES, POSTS, bump_version
+
+
+@receiver(post_save, sender=Post)
+def update_navigation(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        on_post_saved(instance, created)
+    bump_version(POSTS)
+
+
+@receiver(post_save, sender=Category)
+def update_category_version(sender, instance, raw=False, **kwargs):
+    bump_version(CATEGORIES)
@@ -0,0 +1,250 @@
+import hashlib
+import heapq
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.urls import reverse
+
+from .models import ArchivedPost, Post
+from .versions import POSTS, get_version
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+MANIFEST_NAME = 'manifest.json'
+INDEX_NAME = 'sitemap.xml'
+PLAN_CACHE_KEY = 'sitemap:plan'
+SITEMAP_MODELS = (ArchivedPost, Post)
+
+
+def shard_name(index):
+    return f'sitemap-{index}.xml'
+
+
+def _encode_key(key):
+    return None if key is None else [key[0].isoformat(), key[1]]
+
+
+def _decode_key(key):
+    return None if key is None else (datetime.fromisoformat(key[0]), key[1])
+
+
+def _iter_rows(queryset, after, last, chunk_size):
+    if last is not None:
+        queryset = queryset.up_to(*last)
+    while True:
+        chunk = queryset
+        if after is not None:
+            chunk = chunk.after(*after)
+        rows = list(chunk[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1][:2]
+
+
+def iter_post_rows(after=None, last=None, chunk_size=None):
+    """ (created_at, id) のキーセットで Post と ArchivedPost を順に取得する
+
+    アーカイブした記事も同じ URL で表示されるので、両方のテーブルをそれぞれの
+    (created_at, id) の索引で読み、キーの順に合わせて返す。
+    OFFSET を使わないため、何ページ目でも取得コストは一定。
+    after は含まず、last は含む。
+    """
+    chunk_size = chunk_size or settings.SITEMAP_CHUNK_SIZE
+    return heapq.merge(*(
+        _iter_rows(model.objects.order_by('created_at', 'id').values_list(
+            'created_at', 'id', 'updated_at'), after, last, chunk_size)
+        for model in SITEMAP_MODELS))
+
+
+def iter_shards(after=None, start=0):
+    """ 記事を SITEMAP_SHARD_SIZE 件ずつのシャードに分けて返す
+
+    after より後ろの記事を start 番から数えたシャードに分け、
+    (シャードのメタデータ, 行のリスト) を順に yield する。
+    """
+    size = settings.SITEMAP_SHARD_SIZE
+    rows = []
+
+    def make_shard(index):
+        digest = hashlib.blake2b(digest_size=16)
+        for created_at, pk, updated_at in rows:
+            digest.update(f'{pk}:{updated_at.isoformat()}\n'.encode())
+        return {
+            'index': index,
+            'after': _encode_key(after),
+            'last': _encode_key(rows[-1][:2]),
+            'count': len(rows),
+            'lastmod': max(row[2] for row in rows).isoformat(),
+            'digest': digest.hexdigest(),
+        }
+
+    index = start
+    for row in iter_post_rows(after=after):
+        rows.append(row)
+        if len(rows) == size:
+            yield make_shard(index), rows
+            after = rows[-1][:2]
+            rows = []
+            index += 1
+    if rows:
+        yield make_shard(index), rows
+
+
+def load_manifest(root=None):
+    path = Path(root or settings.SITEMAP_ROOT) / MANIFEST_NAME
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def manifest_split(manifest):
+    """ マニフェストのうちそのまま使えるシャードの数と、その後ろの起点のキーを返す
+
+    最後のシャードより新しい記事があれば、最後のシャードも作り直しが必要とみなし、
+    その手前までを使えるシャードとする。
+    """
+    if manifest is None or not manifest['shards']:
+        return 0, None
+    shards = manifest['shards']
+    last = shards[-1]
+    key = _decode_key(last['last'])
+    if any(model.objects.after(*key).exists() for model in SITEMAP_MODELS):
+        return len(shards) - 1, _decode_key(last['after'])
+    return len(shards), _decode_key(last['last'])
+
+
+def shard_plan():
+    """ シャードの境界一覧を返す
+
+    build_sitemaps で生成したマニフェストのシャードに、その後に増えた分を
+    キーだけ走査して足す。全件の走査を毎回しないよう、結果は共有キャッシュに
+    SITEMAP_PLAN_TIMEOUT 秒だけ置く。
+    """
+    plan = cache.get(PLAN_CACHE_KEY)
+    if plan is None:
+        manifest = load_manifest()
+        stable, after = manifest_split(manifest)
+        plan = manifest['shards'][:stable] if stable else []
+        plan += [shard for shard, rows in iter_shards(after, start=stable)]
+        cache.set(PLAN_CACHE_KEY, plan, settings.SITEMAP_PLAN_TIMEOUT)
+    return plan
+
+
+def _url_parts():
+    marker = 1234567890
+    url = reverse('blog:post_detail', args=[marker])
+    return url.split(str(marker), 1)
+
+
+def iter_shard_xml(base_url, rows):
+    prefix, suffix = _url_parts()
+    prefix = escape(base_url + prefix)
+    suffix = escape(suffix)
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           f'<urlset xmlns="{SITEMAP_NS}">\n')
+    for created_at, pk, updated_at in rows:
+        yield (f'<url><loc>{prefix}{pk}{suffix}</loc>'
+               f'<lastmod>{updated_at:%Y-%m-%d}</lastmod></url>\n')
+    yield '</urlset>\n'
+
+
+def iter_index_xml(locations):
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           f'<sitemapindex xmlns="{SITEMAP_NS}">\n')
+    for loc, lastmod in locations:
+        yield (f'<sitemap><loc>{escape(loc)}</loc>'
+               f'<lastmod>{lastmod[:10]}</lastmod></sitemap>\n')
+    yield '</sitemapindex>\n'
+
+
+def _write_atomic(path, chunks):
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.writelines(chunks)
+    os.replace(tmp, path)
+
+
+def build_sitemaps(base_url, root=None, force=False):
+    """ サイトマップのインデックスとシャードをディスクに書き出す
+
+    前回のマニフェストとダイジェストが一致するシャードは書き直さない。
+    書き直したシャードの番号のリストを返す。
+    """
+    root = Path(root or settings.SITEMAP_ROOT)
+    root.mkdir(parents=True, exist_ok=True)
+    base_url = base_url.rstrip('/')
+    # 走査を始める前の版を記録し、走査中の変更も古いとみなされるようにする
+    version = get_version(POSTS)
+    manifest = load_manifest(root)
+    previous = {}
+    if manifest is not None and manifest['base_url'] == base_url and not force:
+        previous = {shard['index']: shard for shard in manifest['shards']}
+
+    shards = []
+    written = []
+    for shard, rows in iter_shards():
+        path = root / shard_name(shard['index'])
+        old = previous.get(shard['index'])
+        if old is None or old['digest'] != shard['digest'] or not path.exists():
+            _write_atomic(path, iter_shard_xml(base_url, rows))
+            written.append(shard['index'])
+        shards.append(shard)
+
+    for index in range(len(shards), len(previous)):
+        (root / shard_name(index)).unlink(missing_ok=True)
+    cache.delete(PLAN_CACHE_KEY)
+
+    _write_atomic(root / INDEX_NAME, iter_index_xml(
+        (base_url + reverse('blog:sitemap_shard', args=[shard['index']]),
+         shard['lastmod']) for shard in shards))
+    _write_atomic(root / MANIFEST_NAME, [json.dumps({
+        'base_url': base_url,
+        'version': version,
+        'shards': shards,
+    })])
+    return written
+
+
+def sitemap_index(request):
+    locations = [
+        (request.build_absolute_uri(
+            reverse('blog:sitemap_shard', args=[shard['index']])),
+         shard['lastmod'])
+        for shard in shard_plan()]
+    return StreamingHttpResponse(
+        iter_index_xml(locations), content_type='application/xml')
+
+
+def sitemap_shard(request, index):
+    """ シャードを返す
+
+    境界はキャッシュしたシャード一覧から取る。生成後に Post が変わっていなければ
+    生成済みのファイルを返し、変わっていれば DB からストリーミングする。
+    """
+    plan = shard_plan()
+    if index >= len(plan):
+        raise Http404('No such sitemap shard.')
+    base_url = request.build_absolute_uri('/').rstrip('/')
+
+    manifest = load_manifest()
+    path = Path(settings.SITEMAP_ROOT) / shard_name(index)
+    if (manifest is not None and manifest['base_url'] == base_url
+            and manifest.get('version') == get_version(POSTS)
+            and index < len(manifest['shards']) and path.exists()):
+        return FileResponse(open(path, 'rb'), content_type='application/xml')
+
+    shard = plan[index]
+    last = None if index == len(plan) - 1 else _decode_key(shard['last'])
+    rows = iter_post_rows(after=_decode_key(shard['after']), last=last)
+    if last is None:
+        rows = (row for row, _ in zip(rows, range(settings.SITEMAP_SHARD_SIZE)))
+    return StreamingHttpResponse(
+        iter_shard_xml(base_url, rows), content_type='application/xml')
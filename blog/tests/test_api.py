@@ -0,0 +1,172 @@
+import base64
+
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Category, Post
+
+
+class PostApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="TestCategory")
+        cls.posts = [
+            Post.objects.create(
+                title=f"Post {num}",
+                content=f"Test content {num}",
+                category=cls.category if num % 2 else None)
+            for num in range(5)]
+
+    def test_post_list(self):
+        """ 全ての列を持つ投稿一覧が返ること """
+        response = self.client.get(reverse("blog:api_post_list"))
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[0]["title"], "Post 0")
+        self.assertEqual(set(results[0]), {
+            "id", "title", "content", "category", "created_at", "updated_at"})
+        self.assertIsNone(response.json()["next"])
+
+    def test_sparse_fields(self):
+        """ fields= で指定した列だけが返ること """
+        response = self.client.get(
+            reverse("blog:api_post_list"), {"fields": "id,title"})
+        self.assertEqual(
+            response.json()["results"][0],
+            {"id": self.posts[0].id, "title": "Post 0"})
+
+    def test_unknown_field(self):
+        """ 存在しない列を指定した場合は400になること """
+        response = self.client.get(
+            reverse("blog:api_post_list"), {"fields": "id,password"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination(self):
+        """ カーソルで全ての投稿を重複なく辿れること """
+        url = reverse("blog:api_post_list")
+        params = {"fields": "id", "limit": 2}
+        ids = []
+        while True:
+            data = self.client.get(url, params).json()
+            ids += [item["id"] for item in data["results"]]
+            if data["next"] is None:
+                break
+            params["cursor"] = data["next"]
+        self.assertEqual(ids, [post.id for post in self.posts])
+
+    def test_invalid_cursor(self):
+        """ 不正なカーソルは400になること """
+        response = self.client.get(
+            reverse("blog:api_post_list"), {"cursor": "broken"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_out_of_range_ids(self):
+        """ 64 ビットに収まらない ID やカーソルは400か404になること """
+        url = reverse("blog:api_post_list")
+        response = self.client.get(url, {"ids": "99999999999999999999999"})
+        self.assertEqual(response.status_code, 400)
+        for pk in ("1" + "0" * 30, "1e400"):
+            cursor = base64.urlsafe_b64encode(
+                f'["2026-01-01T00:00:00", {pk}]'.encode()).decode()
+            response = self.client.get(url, {"cursor": cursor})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            reverse("blog:api_post_detail", args=[10 ** 30]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_fetch(self):
+        """ ids= で指定した投稿を1クエリで取得できること """
+        ids = f"{self.posts[1].id},{self.posts[3].id}"
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("blog:api_post_list"), {"ids": ids, "fields": "id"})
+        self.assertEqual(
+            response.json()["results"],
+            [{"id": self.posts[1].id}, {"id": self.posts[3].id}])
+
+    def test_include_category(self):
+        """ include=category でカテゴリが埋め込まれること """
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("blog:api_post_list"),
+                {"fields": "id", "include": "category"})
+        results = response.json()["results"]
+        self.assertIsNone(results[0]["category"])
+        self.assertEqual(
+            results[1]["category"],
+            {"id": self.category.id, "name": "TestCategory"})
+
+    def test_conditional_get(self):
+        """ ETag が一致する場合は304が返り、更新後は200に戻ること """
+        url = reverse("blog:api_post_list")
+        etag = self.client.get(url).headers["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(title="New Post", content="New content")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_without_queries(self):
+        """ 変更がなければ DB を読まずに304が返ること """
+        url = reverse("blog:api_post_list")
+        etag = self.client.get(url).headers["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_conditional_get_after_category_rename(self):
+        """ カテゴリを埋め込む場合、カテゴリ名の変更で ETag が変わること """
+        url = reverse("blog:api_post_list")
+        etag = self.client.get(url, {"include": "category"}).headers["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Renamed"
+            self.category.save()
+        response = self.client.get(
+            url, {"include": "category"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["results"][1]["category"]["name"], "Renamed")
+
+    def test_post_detail(self):
+        """ 投稿詳細が返り、存在しない場合は404になること """
+        response = self.client.get(
+            reverse("blog:api_post_detail", args=[self.posts[1].id]),
+            {"fields": "title", "include": "category"})
+        self.assertEqual(response.json(), {
+            "title": "Post 1",
+            "category": {"id": self.category.id, "name": "TestCategory"}})
+        response = self.client.get(
+            reverse("blog:api_post_detail", args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CategoryApiTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = [
+            Category.objects.create(name=f"Category {num}")
+            for num in range(3)]
+
+    def test_category_list(self):
+        """ カテゴリ一覧が返ること """
+        response = self.client.get(reverse("blog:api_category_list"))
+        self.assertEqual(len(response.json()["results"]), 3)
+
+    def test_batch_fetch(self):
+        """ ids= で指定したカテゴリだけが返ること """
+        response = self.client.get(
+            reverse("blog:api_category_list"),
+            {"ids": str(self.categories[2].id), "fields": "name"})
+        self.assertEqual(response.json()["results"], [{"name": "Category 2"}])
+
+    def test_conditional_get(self):
+        """ ETag が一致する場合は304が返ること """
+        url = reverse("blog:api_category_list")
+        etag = self.client.get(url).headers["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..archive import archive_posts
+from ..models import ArchivedPost, Category, Post
+from ..purge import purge_deleted
+
+
+class ArchivePostsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="TestCategory")
+        cls.posts = [
+            Post.objects.create(title=f"Post {num}",
+                                content=f"Test content {num}",
+                                category=cls.category)
+            for num in range(5)]
+        # 最初の3件を2年前の記事にする
+        old = timezone.now() - timedelta(days=730)
+        for num, post in enumerate(cls.posts[:3]):
+            Post.objects.filter(pk=post.pk).update(
+                created_at=old + timedelta(seconds=num))
+
+    def test_archive_old_posts(self):
+        """ 古い記事だけがアーカイブテーブルに移ること """
+        self.assertEqual(archive_posts(365, batch_size=2, pause=0), 3)
+        self.assertEqual(
+            list(Post.all_objects.values_list("id", flat=True)),
+            [post.id for post in self.posts[3:]])
+        archived = ArchivedPost.objects.get(pk=self.posts[0].pk)
+        self.assertEqual(archived.title, "Post 0")
+        self.assertEqual(archived.category, self.category)
+
+    def test_navigation_after_archive(self):
+        """ アーカイブ後に残った先頭の記事の前後・関連記事が張り直されること """
+        archive_posts(365, pause=0)
+        post = Post.objects.get(pk=self.posts[3].pk)
+        self.assertIsNone(post.previous_post_id)
+        self.assertEqual(post.related_post_ids, [self.posts[4].id])
+
+    def test_detail_view_falls_through(self):
+        """ アーカイブした記事も同じ URL で表示されること """
+        archive_posts(365, pause=0)
+        response = self.client.get(
+            reverse("blog:post_detail", args=[self.posts[0].id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["object"].title, "Post 0")
+        self.assertTrue(response.context["archived"])
+        self.assertContains(response, "This post is archived.")
+
+    def test_detail_view_not_found(self):
+        """ Post にもアーカイブにもない記事は404になること """
+        response = self.client.get(reverse("blog:post_detail", args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_api_detail_falls_through(self):
+        """ API の詳細でもアーカイブした記事が返されること """
+        archive_posts(365, pause=0)
+        response = self.client.get(
+            reverse("blog:api_post_detail", args=[self.posts[0].id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "Post 0")
+
+    def test_api_batch_fetch_falls_through(self):
+        """ ids= でアーカイブした記事と残った記事をまとめて取得できること """
+        archive_posts(365, pause=0)
+        ids = [self.posts[4].id, self.posts[1].id, self.posts[3].id, 999]
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("blog:api_post_list"),
+                {"ids": ",".join(map(str, ids)), "fields": "id,title",
+                 "include": "category"})
+        self.assertEqual(response.json()["results"], [
+            {"id": self.posts[num].id, "title": f"Post {num}",
+             "category": {"id": self.category.id, "name": "TestCategory"}}
+            for num in (1, 3, 4)])
+
+    def test_archive_list(self):
+        """ アーカイブ一覧に新しい順で表示されること """
+        archive_posts(365, pause=0)
+        response = self.client.get(reverse("blog:archive_list"))
+        self.assertTemplateUsed(response, "blog/archive_list.html")
+        self.assertEqual(
+            [post.title for post in response.context["object_list"]],
+            ["Post 2", "Post 1", "Post 0"])
+
+    def test_purge_archived_posts_of_deleted_category(self):
+        """ 論理削除したカテゴリのアーカイブ記事も物理削除されること """
+        archive_posts(365, pause=0)
+        self.category.soft_delete()
+        self.assertEqual(purge_deleted(pause=0), {"posts": 5, "categories": 1})
+        self.assertFalse(ArchivedPost.all_objects.exists())
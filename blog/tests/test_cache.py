@@ -0,0 +1,89 @@
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from myblog.cache import SQLiteCache
+
+
+def _incr_many(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr("counter")
+
+
+class SQLiteCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.location = Path(tmp.name) / "cache.sqlite3"
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {"OPTIONS": options})
+
+    def test_set_and_get(self):
+        """ 保存した値を取得できること """
+        self.cache.set("key", {"value": 1})
+        self.assertEqual(self.cache.get("key"), {"value": 1})
+        self.assertIsNone(self.cache.get("missing"))
+
+    def test_shared_between_instances(self):
+        """ 別のインスタンス(別プロセス相当)から更新・削除が見えること """
+        other = self.make_cache()
+        self.cache.set("key", "value")
+        self.assertEqual(other.get("key"), "value")
+        other.delete("key")
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_expiry(self):
+        """ 期限切れの値は取得できず、add で上書きできること """
+        self.cache.set("key", "old", timeout=0)
+        self.assertIsNone(self.cache.get("key"))
+        self.assertTrue(self.cache.add("key", "new"))
+        self.assertFalse(self.cache.add("key", "newer"))
+        self.assertEqual(self.cache.get("key"), "new")
+
+    def test_many(self):
+        """ get_many/set_many/delete_many が動作すること """
+        self.cache.set_many({"a": 1, "b": 2})
+        self.assertEqual(self.cache.get_many(["a", "b", "c"]), {"a": 1, "b": 2})
+        self.cache.delete_many(["a"])
+        self.assertEqual(self.cache.get_many(["a", "b"]), {"b": 2})
+
+    def test_incr(self):
+        """ incr/decr が動作し、存在しないキーは ValueError になること """
+        self.cache.set("counter", 1)
+        self.assertEqual(self.cache.incr("counter", 5), 6)
+        self.assertEqual(self.cache.decr("counter"), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+
+    def test_incr_is_atomic_across_processes(self):
+        """ 複数プロセスから同時に incr しても取りこぼさないこと """
+        self.cache.set("counter", 0)
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=_incr_many, args=(self.location, 50))
+            for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get("counter"), 200)
+
+    def test_lru_eviction(self):
+        """ MAX_ENTRIES を超えたら最終アクセスの古いものから捨てること """
+        cache = self.make_cache(
+            MAX_ENTRIES=4, CULL_FREQUENCY=2, ACCESS_RESOLUTION=0)
+        for num in range(4):
+            cache.set(f"key{num}", num)
+            time.sleep(0.01)
+        cache.get("key0")
+        cache.set("key4", 4)
+        self.assertEqual(
+            sorted(cache.get_many([f"key{num}" for num in range(5)])),
+            ["key0", "key3", "key4"])
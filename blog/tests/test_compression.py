@@ -0,0 +1,108 @@
+import gzip
+from unittest import mock, skipIf
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+
+from myblog import middleware
+from ..models import Post
+
+
+class CompressionTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for num in range(20):
+            Post.objects.create(title=f"Post {num}", content="Test Content")
+
+    def test_not_compressed_without_accept_encoding(self):
+        """ Accept-Encoding がなければ圧縮しないこと """
+        response = self.client.get(reverse("blog:post_list"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    @mock.patch.object(middleware, "brotli", None)
+    def test_gzip(self):
+        """ gzip を受け付ける場合は gzip で圧縮されること """
+        plain = self.client.get(reverse("blog:post_list")).content
+        response = self.client.get(
+            reverse("blog:post_list"), HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain)
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+
+    @mock.patch.object(middleware, "brotli", None)
+    def test_compressed_output_is_cached(self):
+        """ 同じ内容は2回目以降圧縮し直さないこと """
+        url = reverse("blog:post_list")
+        self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        with mock.patch.object(middleware.gzip, "compress") as compress:
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        compress.assert_not_called()
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    @mock.patch.object(middleware, "brotli", None)
+    def test_compressed_output_in_own_cache(self):
+        """ 圧縮結果は default とは別のキャッシュに置かれること """
+        cache.clear()
+        caches["compressed"].clear()
+        self.client.get(reverse("blog:post_list"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(len(caches["compressed"]._cache), 1)
+        self.assertFalse(
+            any(":compressed:" in key for key in cache._cache))
+
+    @mock.patch.object(middleware, "brotli", None)
+    def test_streaming_response(self):
+        """ ストリーミングレスポンスが逐次圧縮されること """
+        response = self.client.get(
+            reverse("blog:sitemap_shard", args=[0]),
+            HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertFalse(response.has_header("Content-Length"))
+        compressed = b"".join(response.streaming_content)
+        content = gzip.decompress(compressed)
+        self.assertEqual(content.count(b"<url>"), 20)
+        # URL ごとに flush せず、一度に圧縮した場合と同程度の大きさになること
+        # (ヘッダのファイル名の詰め物は最大 100 バイト)
+        self.assertLessEqual(
+            len(compressed), len(gzip.compress(content, compresslevel=4)) + 101)
+
+    @mock.patch.object(middleware, "brotli", None)
+    def test_per_user_response_not_cached(self):
+        """ ユーザーごとの内容は圧縮結果をキャッシュせず、詰め物を入れること """
+        User.objects.create_user(username="testuser", password="testpass")
+        self.client.login(username="testuser", password="testpass")
+        with mock.patch.object(
+                middleware.CompressionMiddleware, "compress_cached") as cached:
+            response = self.client.get(
+                reverse("blog:post_create"), HTTP_ACCEPT_ENCODING="gzip")
+        cached.assert_not_called()
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        # gzip ヘッダの FNAME フラグ
+        self.assertTrue(response.content[3] & 0x08)
+
+    def test_images_not_compressed(self):
+        """ 画像など圧縮済みの形式は圧縮しないこと """
+        compress = middleware.CompressionMiddleware(
+            lambda request: HttpResponse(b"x" * 1000, content_type="image/png"))
+        response = compress(
+            RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_quality_zero_is_refused(self):
+        """ q=0 の符号化方式は使わないこと """
+        response = self.client.get(
+            reverse("blog:post_list"), HTTP_ACCEPT_ENCODING="gzip;q=0, br;q=0")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    @skipIf(middleware.brotli is None, "brotli is not installed")
+    def test_brotli(self):
+        """ brotli がある場合は br が優先されること """
+        plain = self.client.get(reverse("blog:post_list")).content
+        response = self.client.get(
+            reverse("blog:post_list"), HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(middleware.brotli.decompress(response.content), plain)
@@ -0,0 +1,164 @@
+import io
+import tempfile
+from pathlib import Path
+from unittest import skipIf
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..images import attach_image, build_pending_thumbnails, image_dir
+from ..models import Post, PostImage
+from ..purge import purge_deleted
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def make_png(width=800, height=600, color="red"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@skipIf(Image is None, "Pillow is not installed")
+class PostImageTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass")
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media_root = Path(tmp.name)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, IMAGE_VARIANT_WIDTHS=[320, 640])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.login(username="testuser", password="testpass")
+
+    def post_with_image(self, title, content):
+        return self.client.post(reverse("blog:post_create"), {
+            "title": title,
+            "content": "New content",
+            "category": "",
+            "image": SimpleUploadedFile("photo.png", content)})
+
+    def test_upload_is_stored_by_hash(self):
+        """ アップロードした画像が内容のハッシュで保存され、生成待ちになること """
+        self.post_with_image("New Post", make_png())
+        image = PostImage.objects.get(post__title="New Post")
+        self.assertEqual(image.status, PostImage.PENDING)
+        self.assertTrue(image.original.startswith(f"images/{image.sha256[:2]}/"))
+        self.assertTrue((self.media_root / image.original).exists())
+
+    def test_invalid_extension(self):
+        """ 画像以外の拡張子は受け付けないこと """
+        response = self.client.post(reverse("blog:post_create"), {
+            "title": "New Post",
+            "content": "New content",
+            "category": "",
+            "image": SimpleUploadedFile("script.sh", b"echo")})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("image", response.context["form"].errors)
+        self.assertFalse(Post.objects.exists())
+
+    def test_non_image_content(self):
+        """ 拡張子が画像でも中身が画像でなければ受け付けないこと """
+        response = self.post_with_image("New Post", b"<html><script></script>")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("image", response.context["form"].errors)
+        self.assertFalse(PostImage.objects.exists())
+
+    def test_extension_follows_content(self):
+        """ 保存時の拡張子はファイル名ではなく実際の形式から決まること """
+        buffer = io.BytesIO()
+        Image.new("RGB", (10, 10)).save(buffer, "JPEG")
+        self.post_with_image("New Post", buffer.getvalue())
+        self.assertTrue(PostImage.objects.get().original.endswith("/original.jpg"))
+
+    def test_build_thumbnails(self):
+        """ プロセスプールで WebP と JPEG の派生画像が生成されること """
+        self.post_with_image("New Post", make_png())
+        self.assertEqual(build_pending_thumbnails(workers=1), 1)
+        image = PostImage.objects.get()
+        self.assertEqual(image.status, PostImage.READY)
+        self.assertEqual((image.width, image.height), (800, 600))
+        self.assertEqual(
+            sorted((v["format"], v["width"]) for v in image.variants),
+            [("jpg", 320), ("jpg", 640), ("webp", 320), ("webp", 640)])
+        for variant in image.variants:
+            self.assertTrue((self.media_root / variant["path"]).exists())
+
+    def test_duplicate_upload_reuses_variants(self):
+        """ 同じ内容の画像はファイルと派生画像を共有すること """
+        content = make_png()
+        self.post_with_image("First Post", content)
+        build_pending_thumbnails(workers=1)
+        self.post_with_image("Second Post", content)
+        first, second = PostImage.objects.order_by("id")
+        self.assertEqual(first.original, second.original)
+        self.assertEqual(second.status, PostImage.READY)
+        self.assertEqual(second.variants, first.variants)
+
+    def test_detail_renders_srcset(self):
+        """ 詳細ページが保存済みの情報から srcset を出力すること """
+        self.post_with_image("New Post", make_png())
+        build_pending_thumbnails(workers=1)
+        image = PostImage.objects.get()
+        url = reverse("blog:post_detail", args=[image.post_id])
+        self.client.logout()
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(
+            response, f"/media/images/{image.sha256[:2]}/{image.sha256}/320.webp 320w")
+
+    def test_media_cache_headers(self):
+        """ 画像が長期間キャッシュ可能なヘッダー付きで配信されること """
+        self.post_with_image("New Post", make_png())
+        image = PostImage.objects.get()
+        response = self.client.get(f"/media/{image.original}")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("max-age=31536000", response["Cache-Control"])
+        self.assertIn("immutable", response["Cache-Control"])
+
+    def test_media_only_serves_stored_images(self):
+        """ 保存済みの画像以外のパスは配信しないこと """
+        tmp_dir = self.media_root / "images" / "tmp"
+        tmp_dir.mkdir(parents=True)
+        (tmp_dir / "partial").write_bytes(b"partial")
+        response = self.client.get("/media/images/tmp/partial")
+        self.assertEqual(response.status_code, 404)
+
+    def test_failed_upload_leaves_no_tmp_file(self):
+        """ 書き出しの途中で失敗しても一時ファイルが残らないこと """
+        class BrokenUpload(SimpleUploadedFile):
+            def chunks(self, chunk_size=None):
+                yield b"partial"
+                raise OSError("connection reset")
+
+        post = Post.objects.create(title="New Post", content="New content")
+        with self.assertRaises(OSError):
+            attach_image(post, BrokenUpload("photo.png", b""))
+        self.assertEqual(list((self.media_root / "images" / "tmp").iterdir()), [])
+        self.assertFalse(PostImage.objects.exists())
+
+    def test_purge_removes_unused_files(self):
+        """ 物理削除で参照されなくなった画像のファイルだけが削除されること """
+        shared, own = make_png(), make_png(color="blue")
+        self.post_with_image("First Post", shared)
+        self.post_with_image("Second Post", shared)
+        self.post_with_image("Third Post", own)
+        build_pending_thumbnails(workers=1)
+        first, second, third = PostImage.objects.order_by("id")
+        Post.objects.filter(pk__in=[first.post_id, third.post_id]).soft_delete()
+        purge_deleted(pause=0)
+        self.assertTrue((self.media_root / second.original).exists())
+        self.assertFalse((self.media_root / image_dir(third.sha256)).exists())
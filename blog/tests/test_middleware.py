@@ -0,0 +1,120 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from myblog import middleware
+from myblog.middleware import AdmissionControlMiddleware, admission_counters
+
+
+class AdmissionControlTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass")
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username="testuser", password="testpass")
+
+    def post_new(self, num=0):
+        return self.client.post(
+            reverse("blog:post_create"), {
+                "title": f"New Post {num}",
+                "content": "New content",
+                "category": ""})
+
+    @override_settings(ADMISSION_CONTROL={
+        "VIEWS": ["blog:post_create"], "USER_RATE": 0.01, "USER_BURST": 2})
+    def test_user_rate_limit(self):
+        """ ユーザーごとのバケットを超えた書き込みは429になること """
+        before = admission_counters()
+        self.assertEqual(self.post_new(0).status_code, 302)
+        self.assertEqual(self.post_new(1).status_code, 302)
+        response = self.post_new(2)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response.headers["Retry-After"]), 1)
+        after = admission_counters()
+        self.assertEqual(after["admitted"] - before["admitted"], 2)
+        self.assertEqual(after["shed_rate"] - before["shed_rate"], 1)
+
+    @override_settings(ADMISSION_CONTROL={
+        "VIEWS": ["blog:post_create"], "MAX_IN_FLIGHT": 0, "QUEUE_SIZE": 0})
+    def test_queue_full(self):
+        """ 同時実行数と待ち行列が埋まっている場合はすぐに503になること """
+        before = admission_counters()
+        response = self.post_new()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(
+            admission_counters()["shed_queue"] - before["shed_queue"], 1)
+
+    @override_settings(ADMISSION_CONTROL={
+        "VIEWS": ["blog:post_create"], "MAX_IN_FLIGHT": 0, "QUEUE_SIZE": 0})
+    def test_reads_not_limited(self):
+        """ 読み込みは制限の対象外であること """
+        self.assertEqual(
+            self.client.get(reverse("blog:post_create")).status_code, 200)
+        self.assertEqual(
+            self.client.get(reverse("blog:post_list")).status_code, 200)
+
+    @override_settings(ADMISSION_CONTROL={
+        "VIEWS": ["blog:post_create"], "GLOBAL_RATE": 0.01,
+        "GLOBAL_BURST": 2})
+    def test_global_rate_shared_by_workers(self):
+        """ 全体のレートは複数のワーカーで合計して数えること """
+        workers = [
+            AdmissionControlMiddleware(lambda request: HttpResponse())
+            for _ in range(2)]
+        self.assertEqual(workers[0]._take_global(), 0)
+        self.assertEqual(workers[1]._take_global(), 0)
+        self.assertGreater(workers[0]._take_global(), 0)
+        self.assertGreater(workers[1]._take_global(), 0)
+
+    @override_settings(ADMISSION_CONTROL={
+        "VIEWS": ["blog:post_create"], "USER_RATE": 0.01, "USER_BURST": 2})
+    def test_user_rate_shared_by_workers(self):
+        """ ユーザーごとのレートも複数のワーカーで合計して数えること """
+        workers = [
+            AdmissionControlMiddleware(lambda request: HttpResponse())
+            for _ in range(2)]
+        request = RequestFactory().post("/")
+        request.user = User.objects.get(username="testuser")
+        self.assertEqual(workers[0]._take_user(request), 0)
+        self.assertEqual(workers[1]._take_user(request), 0)
+        self.assertGreater(workers[0]._take_user(request), 0)
+        self.assertGreater(workers[1]._take_user(request), 0)
+
+    @override_settings(ADMISSION_CONTROL={
+        "VIEWS": ["blog:post_create"], "GLOBAL_RATE": 1.0, "GLOBAL_BURST": 4})
+    def test_global_rate_is_a_bucket(self):
+        """ 時間窓の境目をまたいでも GLOBAL_BURST 件を超えて受け付けないこと """
+        worker = AdmissionControlMiddleware(lambda request: HttpResponse())
+        with mock.patch.object(middleware.time, "time") as now:
+            now.return_value = 1003.9
+            self.assertEqual([worker._take_global() for _ in range(4)], [0] * 4)
+            now.return_value = 1004.1
+            self.assertAlmostEqual(worker._take_global(), 0.8)
+            # 空いた分だけ受け付けること
+            now.return_value = 1005.0
+            self.assertEqual(worker._take_global(), 0)
+            self.assertGreater(worker._take_global(), 0)
+
+    @override_settings(ADMISSION_CONTROL={
+        "VIEWS": ["blog:post_create"], "MAX_IN_FLIGHT": 1})
+    def test_in_flight_shared_by_workers(self):
+        """ 同時実行数の枠は複数のワーカーで共有され、返却後に再び借りられること """
+        workers = [
+            AdmissionControlMiddleware(lambda request: HttpResponse())
+            for _ in range(2)]
+        slot = workers[0]._acquire_slot()
+        self.assertIsNotNone(slot)
+        self.assertIsNone(workers[1]._acquire_slot())
+        cache.delete(slot)
+        self.assertEqual(workers[1]._acquire_slot(), slot)
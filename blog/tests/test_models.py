@@ -105,3 +105,45 @@ class PostModelTest(TestCase):
         post.save()
         self.category.delete()
         self.assertEqual(Post.objects.count(), 0)
+
+    def test_post_soft_delete(self):
+        """ 論理削除したPostは読み出し対象から除外されること """
+        post = Post.objects.create(title="Test Post",
+                                   content="Test Content",
+                                   category=self.category)
+        post.soft_delete()
+        self.assertFalse(Post.objects.filter(id=post.id).exists())
+        self.assertIsNotNone(Post.all_objects.get(id=post.id).deleted_at)
+
+    def test_category_soft_delete(self):
+        """ 論理削除したCategoryのPostも読み出し対象から除外されること """
+        Post.objects.create(title="Test Post",
+                            content="Test Content",
+                            category=self.category)
+        Post.objects.create(title="No Category Post",
+                            content="Test Content",
+                            category=None)
+        self.category.soft_delete()
+        self.assertFalse(Category.objects.filter(id=self.category.id).exists())
+        self.assertEqual(
+            list(Post.objects.values_list("title", flat=True)),
+            ["No Category Post"])
+        self.assertEqual(Post.all_objects.count(), 2)
+
+    def test_keyset_filters_seek_index(self):
+        """ キーセットの絞り込みが (created_at, id) の索引をキーの位置から読むこと """
+        post = Post.objects.create(title="Test Post", content="Test Content")
+        key = (post.created_at, post.id)
+        plan = Post.all_objects.after(*key).order_by("created_at", "id").explain()
+        self.assertIn("blog_post_created_id_idx (created_at>?)", plan)
+        plan = Post.all_objects.before(*key).order_by(
+            "-created_at", "-id").explain()
+        self.assertIn("blog_post_created_id_idx (created_at<?)", plan)
+
+    def test_live_posts_ordered_by_index(self):
+        """ 公開中の Post の一覧が deleted_at の索引ではなく作成順の索引で並ぶこと """
+        plan = Post.objects.order_by("-created_at", "-id").explain()
+        self.assertIn("blog_post_created_id_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+        plan = Post.all_objects.filter(deleted_at__isnull=False).explain()
+        self.assertIn("blog_post_deleted_idx", plan)
@@ -0,0 +1,161 @@
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Category, Post
+from ..navigation import rebuild_navigation
+from ..purge import purge_deleted
+
+
+class NavigationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="TestCategory")
+        cls.other_category = Category.objects.create(name="OtherCategory")
+        cls.posts = [
+            Post.objects.create(
+                title=f"Post {num}",
+                content="Test Content",
+                category=cls.category if num < 4 else cls.other_category)
+            for num in range(6)]
+
+    def navigation(self, post):
+        post = Post.objects.get(pk=post.pk)
+        return (post.previous_post_id, post.next_post_id,
+                post.related_post_ids)
+
+    def ids(self, *nums):
+        return [self.posts[num].id for num in nums]
+
+    def test_created_posts(self):
+        """ 作成時に前後の記事と同じカテゴリの近い記事が設定されること """
+        p = self.posts
+        self.assertEqual(self.navigation(p[0]), (None, p[1].id, self.ids(1, 2)))
+        self.assertEqual(
+            self.navigation(p[2]), (p[1].id, p[3].id, self.ids(0, 1, 3)))
+        self.assertEqual(self.navigation(p[3]), (p[2].id, p[4].id, self.ids(1, 2)))
+        self.assertEqual(self.navigation(p[5]), (p[4].id, None, self.ids(4)))
+
+    def test_recategorised_post(self):
+        """ カテゴリ変更時に移動元と移動先の両方の関連記事が更新されること """
+        post = Post.objects.get(pk=self.posts[3].pk)
+        post.category = self.other_category
+        post.save()
+        self.assertEqual(self.navigation(self.posts[1])[2], self.ids(0, 2))
+        self.assertEqual(self.navigation(self.posts[3])[2], self.ids(4, 5))
+        self.assertEqual(self.navigation(self.posts[5])[2], self.ids(3, 4))
+
+    def test_soft_deleted_post(self):
+        """ 論理削除した記事が前後・関連記事から外れること """
+        Post.objects.get(pk=self.posts[2].pk).soft_delete()
+        self.assertEqual(self.navigation(self.posts[1])[:2],
+                         (self.posts[0].id, self.posts[3].id))
+        self.assertEqual(self.navigation(self.posts[3])[:2],
+                         (self.posts[1].id, self.posts[4].id))
+        self.assertEqual(self.navigation(self.posts[0])[2], self.ids(1, 3))
+
+    def test_bulk_soft_deleted_posts(self):
+        """ 一括の論理削除でも周りの記事が更新されること """
+        Post.objects.filter(pk__in=self.ids(1, 2)).soft_delete()
+        self.assertEqual(self.navigation(self.posts[0])[1:],
+                         (self.posts[3].id, self.ids(3)))
+
+    def test_soft_deleted_category(self):
+        """ カテゴリを論理削除すると残った記事の前後が張り直されること """
+        category = Category.objects.create(name="Alternating")
+        posts = [
+            Post.objects.create(
+                title=f"Alternating {num}", content="Test Content",
+                category=category if num % 2 else self.other_category)
+            for num in range(5)]
+        category.soft_delete()
+        self.assertEqual(self.navigation(posts[2])[:2],
+                         (posts[0].id, posts[4].id))
+        self.assertEqual(self.navigation(posts[0])[:2],
+                         (self.posts[5].id, posts[2].id))
+        self.assertEqual(self.navigation(posts[4])[:2], (posts[2].id, None))
+
+    def test_bulk_soft_deleted_categories(self):
+        """ カテゴリの一括の論理削除でも残った記事の前後が張り直されること """
+        Category.objects.filter(pk=self.category.pk).soft_delete()
+        self.assertEqual(self.navigation(self.posts[4])[:2],
+                         (None, self.posts[5].id))
+
+    def test_purged_category(self):
+        """ カテゴリの物理削除後に残った記事の前後が張り直されること """
+        self.category.soft_delete()
+        purge_deleted(pause=0)
+        self.assertEqual(self.navigation(self.posts[4])[:2],
+                         (None, self.posts[5].id))
+
+    def test_rebuild_matches_incremental(self):
+        """ 一括の再計算と書き込み時の更新が同じ結果になること """
+        expected = [self.navigation(post) for post in self.posts]
+        Post.objects.update(
+            previous_post=None, next_post=None, related_post_ids=[])
+        rebuild_navigation(batch_size=2)
+        self.assertEqual([self.navigation(post) for post in self.posts],
+                         expected)
+
+    def test_mixed_changes_match_rebuild(self):
+        """ 作成・移動・削除を重ねても一括の再計算と同じ結果になること """
+        posts = self.posts + [
+            Post.objects.create(title=f"New {num}", content="Test Content",
+                                category=self.category if num % 2 else None)
+            for num in range(4)]
+        moved = Post.objects.get(pk=posts[1].pk)
+        moved.category = self.other_category
+        moved.save()
+        moved = Post.objects.get(pk=posts[7].pk)
+        moved.category = None
+        moved.save()
+        Post.objects.get(pk=posts[4].pk).soft_delete()
+        Post.objects.filter(pk__in=[posts[2].id, posts[3].id, posts[8].id]
+                            ).soft_delete()
+        live = Post.objects.order_by("created_at", "id")
+        incremental = [self.navigation(post) for post in live]
+        rebuild_navigation(batch_size=2)
+        self.assertEqual([self.navigation(post) for post in live], incremental)
+
+    def test_create_queries(self):
+        """ 作成時の更新が記事数によらない少数のクエリで済むこと """
+        # SAVEPOINT, INSERT, 前後のキー 3 + UPDATE, カテゴリ内のキー 3 + UPDATE, RELEASE
+        with self.assertNumQueries(11):
+            Post.objects.create(title="New Post", content="Test Content",
+                                category=self.category)
+
+    def test_create_reads_seek_index(self):
+        """ 作成時に前後のキーを読むクエリが索引をキーの位置から読むこと """
+        selects = []
+
+        def record(execute, sql, params, many, context):
+            if sql.startswith("SELECT"):
+                selects.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            Post.objects.create(title="New Post", content="Test Content",
+                                category=self.category)
+        self.assertEqual(len(selects), 6)
+        for sql, params in selects:
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+                plan = "\n".join(row[-1] for row in cursor.fetchall())
+            self.assertRegex(plan, r"SEARCH blog_post USING INDEX "
+                                   r"blog_post_(created_id|category)_idx \(")
+            self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_detail_view_queries(self):
+        """ 詳細ページが固定のクエリ数で前後・関連記事を表示すること """
+        url = reverse("blog:post_detail", args=[self.posts[2].id])
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.context["previous_post"],
+                         {"id": self.posts[1].id, "title": "Post 1"})
+        self.assertEqual(response.context["next_post"],
+                         {"id": self.posts[3].id, "title": "Post 3"})
+        self.assertEqual(
+            [post["title"] for post in response.context["related_posts"]],
+            ["Post 0", "Post 1", "Post 3"])
+        self.assertContains(response, "More in TestCategory")
@@ -0,0 +1,58 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from ..models import Category, Post
+from ..purge import purge_deleted
+
+
+class PurgeDeletedTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="TestCategory")
+        cls.other_category = Category.objects.create(name="OtherCategory")
+        for num in range(5):
+            Post.objects.create(title=f"Post {num}",
+                                content="Test Content",
+                                category=cls.category)
+        cls.live_post = Post.objects.create(title="Live Post",
+                                            content="Test Content",
+                                            category=cls.other_category)
+
+    def test_purge_soft_deleted_category(self):
+        """ 論理削除したCategoryと配下のPostが物理削除されること """
+        self.category.soft_delete()
+        purged = purge_deleted(batch_size=2, pause=0)
+        self.assertEqual(purged, {"posts": 5, "categories": 1})
+        self.assertEqual(
+            list(Post.all_objects.values_list("id", flat=True)),
+            [self.live_post.id])
+        self.assertFalse(
+            Category.all_objects.filter(id=self.category.id).exists())
+
+    def test_purge_soft_deleted_post(self):
+        """ 論理削除したPostだけが物理削除されること """
+        Post.objects.filter(category=self.category).soft_delete()
+        purged = purge_deleted(pause=0)
+        self.assertEqual(purged, {"posts": 5, "categories": 0})
+        self.assertTrue(
+            Category.all_objects.filter(id=self.category.id).exists())
+
+    def test_purge_stops_at_time_limit(self):
+        """ 制限時間を超えたら残りを次回に回すこと """
+        self.category.soft_delete()
+        purged = purge_deleted(batch_size=2, max_seconds=0, pause=0)
+        self.assertEqual(purged, {"posts": 2, "categories": 0})
+        self.assertEqual(Post.all_objects.count(), 4)
+
+    def test_purge_pauses_between_category_batches(self):
+        """ カテゴリの削除でもバッチの間に書き込みロックを手放すこと """
+        Category.all_objects.filter(id=self.other_category.id).soft_delete()
+        Post.all_objects.filter(category=self.other_category).delete()
+        Category.objects.create(name="Empty").soft_delete()
+        with mock.patch("blog.purge.time.sleep") as sleep:
+            purged = purge_deleted(batch_size=1, pause=0.01)
+        self.assertEqual(purged, {"posts": 0, "categories": 2})
+        sleep.assert_called_with(0.01)
+        self.assertEqual(sleep.call_count, 2)
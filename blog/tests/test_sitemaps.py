@@ -0,0 +1,157 @@
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.cache import cache
+from django.http import FileResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..archive import archive_posts
+from ..models import ArchivedPost, Post
+from ..sitemaps import build_sitemaps, iter_post_rows
+
+
+class SitemapTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.posts = [
+            Post.objects.create(title=f"Post {num}", content="Test Content")
+            for num in range(5)]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        settings_override = override_settings(
+            SITEMAP_ROOT=self.root,
+            SITEMAP_SHARD_SIZE=2,
+            SITEMAP_CHUNK_SIZE=1)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def test_keyset_iteration(self):
+        """ キーセットで全ての Post を (created_at, id) 順に取得できること """
+        ids = [row[1] for row in iter_post_rows()]
+        self.assertEqual(ids, [post.id for post in self.posts])
+
+    def test_index_lists_shards(self):
+        """ インデックスに SHARD_SIZE ごとのシャードが列挙されること """
+        response = self.client.get(reverse("blog:sitemap_index"))
+        self.assertEqual(response.status_code, 200)
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(content.count("<sitemap>"), 3)
+        self.assertIn("http://testserver/sitemap-2.xml", content)
+
+    def test_shard_streamed_from_database(self):
+        """ 生成済みファイルがなくてもシャードがストリーミングされること """
+        response = self.client.get(
+            reverse("blog:sitemap_shard", args=[1]))
+        self.assertEqual(response.status_code, 200)
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(content.count("<url>"), 2)
+        self.assertIn(f"http://testserver/post/{self.posts[2].id}/", content)
+        self.assertIn(f"http://testserver/post/{self.posts[3].id}/", content)
+
+    def test_shard_bounds_from_cached_plan(self):
+        """ シャードの境界はキャッシュした一覧から取り、本文だけを DB から読むこと """
+        Post.objects.bulk_create(
+            Post(title=f"Extra {num}", content="Test Content")
+            for num in range(20))
+        self.client.get(reverse("blog:sitemap_index"))
+        # 本文の 2 チャンク + 空のチャンク 1 回 + アーカイブの空のチャンク 1 回
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                reverse("blog:sitemap_shard", args=[1]))
+            content = b"".join(response.streaming_content).decode()
+        self.assertEqual(content.count("<url>"), 2)
+
+    def test_index_plan_cached(self):
+        """ インデックスのシャード一覧が共有キャッシュから返されること """
+        self.client.get(reverse("blog:sitemap_index"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("blog:sitemap_index"))
+            b"".join(response.streaming_content)
+
+    def test_shard_out_of_range(self):
+        """ 存在しないシャードは404になること """
+        response = self.client.get(
+            reverse("blog:sitemap_shard", args=[3]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_build_writes_all_shards(self):
+        """ 初回生成時は全てのシャードが書き出されること """
+        written = build_sitemaps("http://testserver")
+        self.assertEqual(written, [0, 1, 2])
+        self.assertTrue((self.root / "sitemap.xml").exists())
+        response = self.client.get(
+            reverse("blog:sitemap_shard", args=[0]))
+        content = b"".join(response.streaming_content).decode()
+        self.assertIn(f"http://testserver/post/{self.posts[0].id}/", content)
+
+    def test_build_rewrites_only_changed_shards(self):
+        """ 変更された Post を含むシャードだけが再生成されること """
+        build_sitemaps("http://testserver")
+        post = self.posts[3]
+        post.title = "Updated"
+        post.save()
+        self.assertEqual(build_sitemaps("http://testserver"), [1])
+        self.assertEqual(build_sitemaps("http://testserver"), [])
+
+    def test_posts_after_build_are_listed(self):
+        """ 生成後に増えた記事も、作り直すまでの間シャードとして配信されること """
+        build_sitemaps("http://testserver")
+        new_posts = [
+            Post.objects.create(title=f"New {num}", content="Test Content")
+            for num in range(2)]
+        cache.clear()
+        response = self.client.get(reverse("blog:sitemap_index"))
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(content.count("<sitemap>"), 4)
+
+        response = self.client.get(
+            reverse("blog:sitemap_shard", args=[2]))
+        content = b"".join(response.streaming_content).decode()
+        self.assertIn(f"http://testserver/post/{self.posts[4].id}/", content)
+        self.assertIn(f"http://testserver/post/{new_posts[0].id}/", content)
+        response = self.client.get(
+            reverse("blog:sitemap_shard", args=[3]))
+        content = b"".join(response.streaming_content).decode()
+        self.assertIn(f"http://testserver/post/{new_posts[1].id}/", content)
+
+    def test_stale_build_is_not_served(self):
+        """ 生成後に記事が削除されたら、生成済みのファイルではなく DB から返すこと """
+        build_sitemaps("http://testserver")
+        response = self.client.get(reverse("blog:sitemap_shard", args=[0]))
+        self.assertIsInstance(response, FileResponse)
+        response.close()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.filter(pk=self.posts[1].pk).soft_delete()
+        response = self.client.get(reverse("blog:sitemap_shard", args=[0]))
+        self.assertNotIsInstance(response, FileResponse)
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(content.count("<url>"), 1)
+        self.assertNotIn(f"http://testserver/post/{self.posts[1].id}/", content)
+
+    def test_archived_posts_are_listed(self):
+        """ アーカイブした記事も (created_at, id) の順でシャードに含まれること """
+        old = self.posts[0].created_at - timedelta(days=730)
+        for num, post in enumerate(self.posts[:3]):
+            Post.objects.filter(pk=post.pk).update(
+                created_at=old + timedelta(seconds=num))
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_posts(365, pause=0)
+        self.assertEqual(ArchivedPost.objects.count(), 3)
+        ids = [row[1] for row in iter_post_rows()]
+        self.assertEqual(ids, [post.id for post in self.posts])
+        response = self.client.get(
+            reverse("blog:sitemap_shard", args=[1]))
+        content = b"".join(response.streaming_content).decode()
+        self.assertIn(f"http://testserver/post/{self.posts[2].id}/", content)
+        self.assertIn(f"http://testserver/post/{self.posts[3].id}/", content)
+        archived = ArchivedPost.objects.order_by("created_at", "id")
+        plan = archived.after(old, 0).explain()
+        self.assertIn("blog_archive_created_id_idx (created_at>?)", plan)
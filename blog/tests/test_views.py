@@ -327,6 +327,14 @@ class PostDeleteViewTest(TestCase):
         self.client.post(reverse("blog:post_delete", args=[post_id]))
         self.assertFalse(Post.objects.filter(id=post_id).exists())
 
+    def test_delete_post_is_soft(self):
+        """ 削除は論理削除で、行は残り詳細ページは404になること """
+        post_id = Post.objects.get(title=self.test_post_title).id
+        self.client.post(reverse("blog:post_delete", args=[post_id]))
+        self.assertTrue(Post.all_objects.filter(id=post_id).exists())
+        response = self.client.get(reverse("blog:post_detail", args=[post_id]))
+        self.assertEqual(response.status_code, 404)
+
     def test_not_authenticated_user(self):
         """ ログインしていないユーザーは削除できず、ログインページにリダイレクトされることï """
         self.client.logout()
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.template import engines
+from django.test import TestCase
+from django.urls import get_resolver
+
+from myblog.warmup import compile_templates, populate_urls, warm_up
+
+
+class WarmUpTest(TestCase):
+
+    def test_populate_urls(self):
+        """ blog と認証の URL の逆引き表が構築されること """
+        populate_urls()
+        resolver = get_resolver()
+        self.assertIn("login", resolver.reverse_dict)
+        self.assertIn("blog", resolver.namespace_dict)
+
+    def test_compile_templates(self):
+        """ templates/ 以下のテンプレートがキャッシュローダーに載ること """
+        templates = [
+            path
+            for directory in settings.TEMPLATES[0]["DIRS"]
+            for path in Path(directory).rglob("*.html")]
+        self.assertEqual(compile_templates(), len(templates))
+        loader = engines["django"].engine.template_loaders[0]
+        self.assertIn("blog/post_list.html", loader.get_template_cache)
+        self.assertIn("registration/login.html", loader.get_template_cache)
+
+    def test_warm_up(self):
+        """ ヒープを凍結せずにウォームアップ全体が完了すること """
+        warm_up(freeze=False)
@@ -4,8 +4,12 @@ from .views import (
     PostDetailView,
     PostCreateView,
     PostUpdateView,
-    PostDeleteView
+    PostDeleteView,
+    ArchiveListView,
+    media
 )
+from . import api
+from .sitemaps import sitemap_index, sitemap_shard
 
 app_name = 'blog'
 
@@ -14,5 +18,12 @@ urlpatterns = [
     path('post/<int:pk>/', PostDetailView.as_view(), name='post_detail'),
     path('post/new/', PostCreateView.as_view(), name='post_create'),
     path('post/<int:pk>/edit/', PostUpdateView.as_view(), name='post_update'),
-    path('post/<int:pk>/delete/', PostDeleteView.as_view(), name='post_delete')
+    path('post/<int:pk>/delete/', PostDeleteView.as_view(), name='post_delete'),
+    path('archive/', ArchiveListView.as_view(), name='archive_list'),
+    path('media/<path:path>', media, name='media'),
+    path('api/posts/', api.post_list, name='api_post_list'),
+    path('api/posts/<int:pk>/', api.post_detail, name='api_post_detail'),
+    path('api/categories/', api.category_list, name='api_category_list'),
+    path('sitemap.xml', sitemap_index, name='sitemap_index'),
+    path('sitemap-<int:index>.xml', sitemap_shard, name='sitemap_shard'),
 ]
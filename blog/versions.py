@@ -0,0 +1,38 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+POSTS = 'posts'
+CATEGORIES = 'categories'
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def get_version(name):
+    """ テーブルの版を返す。全ワーカーで共有キャッシュの値を見る
+
+    版は最後に更新された時刻(ナノ秒)なので Last-Modified にも使える。
+    キャッシュから追い出された場合は現在時刻で作り直すため、
+    以前に配った版と同じ値に戻ることはない。
+    """
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), time.time_ns(), timeout=None)
+        version = cache.get(_key(name))
+    return version
+
+
+def bump_version(*names):
+    """ テーブルの版を進める
+
+    トランザクション中ならコミット後に進めるので、新しい版で古い内容が
+    配られることはない。queryset.update() など post_save を送らない
+    書き込みの後には必ず呼ぶこと。
+    """
+    def bump():
+        now = time.time_ns()
+        cache.set_many({_key(name): now for name in names}, timeout=None)
+    transaction.on_commit(bump)
@@ -1,4 +1,11 @@
+import re
+
+from django.conf import settings
+from django.http import Http404, HttpResponseRedirect
+from django.shortcuts import get_object_or_404
 from django.urls import reverse_lazy
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
 from django.views.generic import (
     ListView,
     DetailView,
@@ -7,8 +14,9 @@ from django.views.generic import (
     DeleteView)
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-from .models import Post
+from .models import ArchivedPost, Post, PostImage
 from .forms import PostForm
+from .navigation import get_navigation
 
 
 class PostListView(ListView):
@@ -20,6 +28,38 @@ class PostDetailView(DetailView):
     model = Post
     template_name = 'blog/post_detail.html'
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('category')
+
+    def get_object(self, queryset=None):
+        try:
+            return super().get_object(queryset)
+        except Http404:
+            # Post になければアーカイブを探す
+            return get_object_or_404(
+                ArchivedPost.objects.select_related('category'),
+                pk=self.kwargs['pk'])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if isinstance(self.object, ArchivedPost):
+            context['archived'] = True
+        else:
+            context.update(get_navigation(self.object))
+        context['images'] = PostImage.objects.filter(
+            post_id=self.object.pk, status=PostImage.READY)
+        return context
+
+
+class ArchiveListView(ListView):
+    model = ArchivedPost
+    template_name = 'blog/archive_list.html'
+    paginate_by = 50
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('category').order_by(
+            '-created_at', '-id')
+
 
 class PostCreateView(LoginRequiredMixin, CreateView):
     model = Post
@@ -39,3 +79,24 @@ class PostDeleteView(LoginRequiredMixin, DeleteView):
     model = Post
     template_name = 'blog/post_confirm_delete.html'
     success_url = reverse_lazy('blog:post_list')
+
+    def form_valid(self, form):
+        self.object.soft_delete()
+        return HttpResponseRedirect(self.get_success_url())
+
+
+# images/<ハッシュの先頭 2 文字>/<ハッシュ>/<ファイル名> の完成した画像だけを配信する
+re_media_path = re.compile(r'images/([0-9a-f]{2})/\1[0-9a-f]{62}/[\w-]+\.\w+')
+
+
+def media(request, path):
+    """ 添付画像を配信する。パスは内容のハッシュを含み変わらないので長期間キャッシュさせる
+
+    本番環境ではフロントのウェブサーバーから直接配信すること。
+    """
+    if not re_media_path.fullmatch(path):
+        raise Http404('No such image.')
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    patch_cache_control(
+        response, public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return response
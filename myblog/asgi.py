@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myblog.settings')
 
 application = get_asgi_application()
+
+if settings.WARMUP_ON_STARTUP:
+    from myblog.warmup import warm_up
+    warm_up()
@@ -0,0 +1,220 @@
+"""
+Cache backend shared by every worker process on the host.
+
+Entries live in a single SQLite database in WAL mode, so readers never block
+each other or the writer, and a delete or version bump made by one worker is
+seen by all of them on their next read.  The number of entries is bounded by
+MAX_ENTRIES and the least recently used entries are evicted first.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'myblog.cache.SQLiteCache',
+            'LOCATION': BASE_DIR / 'cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+"""
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = str(location)
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5.0)
+        # 読み出しのたびに書き込まないよう、最終アクセス時刻はこの秒数より古いときだけ更新する
+        self._access_resolution = options.get('ACCESS_RESOLUTION', 1.0)
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # 接続はスレッドごとに持ち、フォーク後の子プロセスでは張り直す
+        if getattr(self._local, 'pid', None) != os.getpid():
+            db = sqlite3.connect(
+                self._path, timeout=self._busy_timeout, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(SCHEMA)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _expired(self, expires, now):
+        return expires is not None and expires <= now
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._db.execute(
+            'INSERT INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires, accessed = excluded.accessed '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, self._dumps(value), self.get_backend_timeout(timeout),
+             now, now))
+        if cursor.rowcount:
+            self._cull()
+        return bool(cursor.rowcount)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._db.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?',
+            (key,)).fetchone()
+        if row is None:
+            return default
+        value, expires, accessed = row
+        now = time.time()
+        if self._expired(expires, now):
+            self._db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now))
+            return default
+        if now - accessed > self._access_resolution:
+            self._db.execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._db.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)',
+            (key, self._dumps(value), self.get_backend_timeout(timeout),
+             time.time()))
+        self._cull()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ?, accessed = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now))
+        return bool(cursor.rowcount)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+        return bool(cursor.rowcount)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        """ 書き込みロックを取ってから読み書きするので、プロセス間でもアトミック """
+        key = self.make_and_validate_key(key, version=version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?',
+                (key,)).fetchone()
+            if row is None or self._expired(row[1], time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (self._dumps(new_value), time.time(), key))
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return new_value
+
+    def get_many(self, keys, version=None):
+        key_map = {
+            self.make_and_validate_key(key, version=version): key
+            for key in keys}
+        if not key_map:
+            return {}
+        now = time.time()
+        rows = self._db.execute(
+            'SELECT key, value, accessed FROM cache WHERE key IN (%s) '
+            'AND (expires IS NULL OR expires > ?)'
+            % ', '.join('?' * len(key_map)),
+            (*key_map, now)).fetchall()
+        stale = [
+            (now, key) for key, value, accessed in rows
+            if now - accessed > self._access_resolution]
+        if stale:
+            self._db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', stale)
+        return {key_map[key]: pickle.loads(value) for key, value, _ in rows}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = [
+            (self.make_and_validate_key(key, version=version),
+             self._dumps(value), expires, now)
+            for key, value in data.items()]
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)', rows)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        self._cull()
+        return []
+
+    def delete_many(self, keys, version=None):
+        self._db.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self.make_and_validate_key(key, version=version),)
+             for key in keys])
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _cull(self):
+        db = self._db
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        db.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            self.clear()
+            return
+        # 最終アクセスが古いものから 1/CULL_FREQUENCY を捨てる
+        db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (count // self._cull_frequency,))
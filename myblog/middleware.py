@@ -0,0 +1,427 @@
+import gzip
+import hashlib
+import io
+import math
+import os
+import re
+import secrets
+import string
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import has_vary_header, patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+ADMISSION_CONTROL_DEFAULTS = {
+    'VIEWS': [],
+    'USER_RATE': 1.0,
+    'USER_BURST': 5,
+    'GLOBAL_RATE': 20.0,
+    'GLOBAL_BURST': 40,
+    'MAX_IN_FLIGHT': 2,
+    'QUEUE_SIZE': 8,
+    'QUEUE_TIMEOUT': 2.0,
+    'SLOT_TIMEOUT': 30,
+}
+
+# 同時実行数の枠が空くのを待つときの確認間隔(秒)
+SLOT_POLL_INTERVAL = 0.05
+
+# バケットを読み書きする間だけ取るロックの期限と、空くのを待つときの確認間隔(秒)
+BUCKET_LOCK_TIMEOUT = 1
+BUCKET_LOCK_POLL_INTERVAL = 0.001
+
+ADMISSION_OUTCOMES = ('admitted', 'shed_rate', 'shed_queue')
+
+
+def admission_counters():
+    """ 全ワーカー合計の受付・拒否件数を返す """
+    keys = {f'admission:{outcome}': outcome for outcome in ADMISSION_OUTCOMES}
+    counts = cache.get_many(keys)
+    return {outcome: counts.get(key, 0) for key, outcome in keys.items()}
+
+
+class AdmissionControlMiddleware:
+    """ 書き込み系ビューへの流入を制限し、超過分はすぐに 429/503 で返す
+
+    SQLite の書き込みロック待ちが積み上がって読み込みまで遅くならないよう、
+    ユーザーごと・全体のレート制限と同時実行数の上限をかける。
+    上限に達したリクエストは QUEUE_SIZE 件まで QUEUE_TIMEOUT 秒だけ待たせる。
+    ユーザーごと・全体のバケットと同時実行数は共有キャッシュに置き、全ワーカーで
+    合計した値で制限する。待ち行列はワーカープロセスごとに持つ。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = {
+            **ADMISSION_CONTROL_DEFAULTS,
+            **getattr(settings, 'ADMISSION_CONTROL', {})}
+        self.views = set(config['VIEWS'])
+        self.user_rate = config['USER_RATE']
+        self.user_burst = config['USER_BURST']
+        self.global_rate = config['GLOBAL_RATE']
+        self.global_burst = config['GLOBAL_BURST']
+        self.max_in_flight = config['MAX_IN_FLIGHT']
+        self.slot_timeout = config['SLOT_TIMEOUT']
+        self.queue_size = config['QUEUE_SIZE']
+        self.queue_timeout = config['QUEUE_TIMEOUT']
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            slot = getattr(request, '_admission_slot', None)
+            if slot is not None:
+                cache.delete(slot)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (request.method in SAFE_METHODS
+                or request.resolver_match.view_name not in self.views):
+            return None
+
+        wait = self._take_user(request)
+        if not wait:
+            wait = self._take_global()
+        if wait:
+            return self._shed('shed_rate', 429, wait)
+
+        slot = self._acquire_slot()
+        if slot is None:
+            with self.lock:
+                if self.waiting >= self.queue_size:
+                    return self._shed('shed_queue', 503, 1)
+                self.waiting += 1
+            try:
+                slot = self._wait_for_slot()
+            finally:
+                with self.lock:
+                    self.waiting -= 1
+            if slot is None:
+                return self._shed('shed_queue', 503, 1)
+
+        request._admission_slot = slot
+        self._count('admitted')
+        return None
+
+    def _take_user(self, request):
+        if request.user.is_authenticated:
+            key = f'admission:user:{request.user.pk}'
+        else:
+            key = f"admission:addr:{request.META.get('REMOTE_ADDR')}"
+        return self._take(key, self.user_rate, self.user_burst)
+
+    def _take_global(self):
+        return self._take('admission:global', self.global_rate, self.global_burst)
+
+    def _take(self, key, rate, burst):
+        """ 共有キャッシュ上のバケットから 1 件取る。足りなければ空くまでの秒数を返す
+
+        GCRA(Generic Cell Rate Algorithm)で、バケットの状態は次の 1 件が
+        空く理論上の時刻(TAT)だけを持つ。1 件ごとに TAT を 1 / rate 秒進め、
+        TAT が現在より burst / rate 秒以上先になるものは受け付けない。
+        読んでから書くまでをキーごとのロックで囲むので、全ワーカーで取り合っても
+        どの時間幅でも rate と burst を超えて受け付けることはない。
+        """
+        interval = 1 / rate
+        with self._locked(key):
+            now = time.time()
+            tat = max(cache.get(key, now), now) + interval
+            if tat - now > burst * interval:
+                return tat - now - burst * interval
+            # TAT を過ぎたバケットは満杯と同じなので、そのときに消えてよい
+            cache.set(key, tat, timeout=math.ceil(tat - now) + 1)
+        return 0
+
+    @contextmanager
+    def _locked(self, key):
+        """ 共有キャッシュの add でキーごとのロックを取る
+
+        ワーカーが落ちて解放されなかったロックも BUCKET_LOCK_TIMEOUT 秒で外れる。
+        """
+        lock = f'{key}:lock'
+        while not cache.add(lock, os.getpid(), timeout=BUCKET_LOCK_TIMEOUT):
+            time.sleep(BUCKET_LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            cache.delete(lock)
+
+    def _acquire_slot(self):
+        """ 共有キャッシュ上の MAX_IN_FLIGHT 個の枠のどれかを借り、そのキーを返す
+
+        add は既にキーがあれば失敗するので、枠を取り合ってもどちらか一方だけが借りられる。
+        ワーカーが落ちて返却されなかった枠も SLOT_TIMEOUT 秒で空く。
+        """
+        for num in range(self.max_in_flight):
+            key = f'admission:slot:{num}'
+            if cache.add(key, os.getpid(), timeout=self.slot_timeout):
+                return key
+        return None
+
+    def _wait_for_slot(self):
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            slot = self._acquire_slot()
+            remaining = deadline - time.monotonic()
+            if slot is not None or remaining <= 0:
+                return slot
+            time.sleep(min(SLOT_POLL_INTERVAL, remaining))
+
+    def _shed(self, outcome, status, retry_after):
+        self._count(outcome)
+        message = 'Too many requests.' if status == 429 else 'Server busy.'
+        response = HttpResponse(message, status=status, content_type='text/plain')
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def _count(self, outcome):
+        key = f'admission:{outcome}'
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key)
+
+
+COMPRESSION_DEFAULTS = {
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    'STREAMING_GZIP_LEVEL': 4,
+    'STREAMING_BROTLI_QUALITY': 3,
+    'STREAMING_FLUSH_SIZE': 64 * 1024,
+    'MIN_LENGTH': 200,
+    'MAX_CACHED_LENGTH': 1024 * 1024,
+    'CACHE_TIMEOUT': 60 * 60,
+    'CACHE_ALIAS': 'compressed',
+}
+
+# 既に圧縮されている形式。圧縮し直しても小さくならず CPU を使うだけなので圧縮しない
+INCOMPRESSIBLE_TYPES = {
+    'application/gzip', 'application/x-gzip', 'application/zip',
+    'application/pdf', 'application/octet-stream', 'font/woff', 'font/woff2',
+}
+INCOMPRESSIBLE_MAJOR_TYPES = {'image', 'audio', 'video'}
+COMPRESSIBLE_IMAGE_TYPES = {'image/svg+xml'}
+
+re_accepts_encoding = re.compile(
+    r'(?:^|,)\s*([a-z*]+)\s*(?:;\s*q=([0-9.]+))?')
+
+
+def accepted_encodings(header):
+    """ Accept-Encoding から q=0 でない符号化方式の集合を返す """
+    accepted = set()
+    for name, quality in re_accepts_encoding.findall(header.lower()):
+        try:
+            if quality and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(name)
+    return accepted
+
+
+def compressible(response):
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type in COMPRESSIBLE_IMAGE_TYPES:
+        return True
+    return (content_type not in INCOMPRESSIBLE_TYPES
+            and content_type.split('/')[0] not in INCOMPRESSIBLE_MAJOR_TYPES)
+
+
+def shareable(request, response):
+    """ 圧縮結果を共有キャッシュに置いてよいレスポンスか
+
+    CSRF トークンやユーザーごとの内容を含むレスポンスは毎回本文が変わり、
+    キャッシュを埋めるだけなので置かない。Vary: Cookie でも Cookie のない
+    リクエストへのレスポンスは誰に対しても同じなので置いてよい。
+    """
+    if response.cookies:
+        return False
+    directives = {
+        directive.split('=')[0].strip().lower()
+        for directive in response.get('Cache-Control', '').split(',')}
+    if directives & {'private', 'no-store'}:
+        return False
+    return not (request.COOKIES and has_vary_header(response, 'Cookie'))
+
+
+def random_filename(max_random_bytes=GZipMiddleware.max_random_bytes):
+    """ gzip のヘッダに入れる長さがランダムなファイル名
+
+    GZipMiddleware と同じく、圧縮後の長さから本文を推測する BREACH 攻撃を緩和する。
+    """
+    length = secrets.randbelow(max_random_bytes) + 1
+    return ''.join(
+        secrets.choice(string.ascii_letters) for _ in range(length))
+
+
+class CompressionMiddleware:
+    """ レスポンスを brotli(インストールされていれば)か gzip で圧縮する
+
+    誰に対しても同じ内容の通常のレスポンスは本文のハッシュごとに圧縮結果を
+    キャッシュし、同じ内容を何度も圧縮し直さない。ユーザーごとの内容を含む
+    レスポンスはキャッシュせず、gzip のヘッダにランダムな長さの詰め物を入れる
+    (brotli には詰め物を入れる場所がないので、受け付けられていれば gzip を使う)。
+    ストリーミングレスポンスは逐次圧縮する。画像など圧縮済みの形式は圧縮しない。
+    圧縮レベルは settings.COMPRESSION で CPU 使用量と相談して調整する。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = {
+            **COMPRESSION_DEFAULTS, **getattr(settings, 'COMPRESSION', {})}
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding') or not compressible(response):
+            return response
+        if not response.streaming and (
+                len(response.content) < self.config['MIN_LENGTH']):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        shared = not response.streaming and shareable(request, response)
+        encoding = self.negotiate(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), padded=not shared)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.compress_async(
+                    encoding, response.streaming_content)
+            else:
+                response.streaming_content = self.compress_stream(
+                    encoding, response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if shared:
+                compressed = self.compress_cached(encoding, response.content)
+            else:
+                compressed = self.compress(encoding, response.content, padded=True)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # 本文が変わるので強い ETag は弱い ETag にする(GZipMiddleware と同じ)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def negotiate(self, header, padded=False):
+        accepted = accepted_encodings(header)
+        if padded and 'gzip' in accepted:
+            return 'gzip'
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def compress(self, encoding, content, padded=False):
+        if encoding == 'br':
+            return brotli.compress(
+                content, quality=self.config['BROTLI_QUALITY'])
+        if not padded:
+            return gzip.compress(
+                content, compresslevel=self.config['GZIP_LEVEL'], mtime=0)
+        buffer = io.BytesIO()
+        with gzip.GzipFile(filename=random_filename(), mode='wb',
+                           compresslevel=self.config['GZIP_LEVEL'],
+                           fileobj=buffer, mtime=0) as f:
+            f.write(content)
+        return buffer.getvalue()
+
+    def compress_cached(self, encoding, content):
+        if len(content) > self.config['MAX_CACHED_LENGTH']:
+            return self.compress(encoding, content)
+        level = self.config[
+            'BROTLI_QUALITY' if encoding == 'br' else 'GZIP_LEVEL']
+        key = f'compressed:{encoding}:{level}:{hashlib.md5(content).hexdigest()}'
+        compressed_cache = caches[self.config['CACHE_ALIAS']]
+        compressed = compressed_cache.get(key)
+        if compressed is None:
+            compressed = self.compress(encoding, content)
+            compressed_cache.set(key, compressed, self.config['CACHE_TIMEOUT'])
+        return compressed
+
+    def compressor(self, encoding):
+        """ (chunk を圧縮する関数, 最後に残りを吐き出す関数) を返す
+
+        チャンクごとに flush すると圧縮率が大きく落ちるので、圧縮器に任せて溜めさせ、
+        前回の flush から STREAMING_FLUSH_SIZE バイトを超えて入力したときだけ flush する。
+        """
+        if encoding == 'br':
+            compressor = brotli.Compressor(
+                quality=self.config['STREAMING_BROTLI_QUALITY'])
+            process, flush, finish = (
+                compressor.process, compressor.flush, compressor.finish)
+        else:
+            buffer = io.BytesIO()
+            compressor = gzip.GzipFile(
+                filename=random_filename(), mode='wb',
+                compresslevel=self.config['STREAMING_GZIP_LEVEL'],
+                fileobj=buffer, mtime=0)
+
+            def drain():
+                data = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                return data
+
+            def process(chunk):
+                compressor.write(chunk)
+                return drain()
+
+            def flush():
+                compressor.flush()
+                return drain()
+
+            def finish():
+                compressor.close()
+                return drain()
+
+        pending = 0
+
+        def compress(chunk):
+            nonlocal pending
+            data = process(chunk)
+            pending += len(chunk)
+            if pending >= self.config['STREAMING_FLUSH_SIZE']:
+                pending = 0
+                data += flush()
+            return data
+
+        return compress, finish
+
+    def compress_stream(self, encoding, chunks):
+        compress, finish = self.compressor(encoding)
+        for chunk in chunks:
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
+
+    async def compress_async(self, encoding, chunks):
+        compress, finish = self.compressor(encoding)
+        async for chunk in chunks:
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,10 +43,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'myblog.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myblog.middleware.AdmissionControlMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -70,6 +73,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'myblog.wsgi.application'
 
+TEST_RUNNER = 'myblog.test_runner.TestRunner'
+
+# wsgi.py/asgi.py の読み込み時に URL・テンプレート等を事前に構築し、GC ヒープを凍結する
+# gunicorn は --preload を付けて起動すると、フォークしたワーカー間でメモリを共有できる
+
+WARMUP_ON_STARTUP = os.environ.get('DJANGO_WARMUP', '1') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
@@ -82,6 +92,65 @@ DATABASES = {
 }
 
 
+# Archive
+# archive_posts コマンドはこの日数より古い記事をアーカイブテーブルに移す
+
+ARCHIVE_AFTER_DAYS = 365
+
+
+# Cache
+# 全ワーカーで共有する SQLite(WAL)上のキャッシュ。MAX_ENTRIES を超えると最終アクセスの古いものから捨てる
+# 圧縮結果は大きいので別の 'compressed' に置き、テーブルの版などが押し出されないようにする
+# (1 件は COMPRESSION の MAX_CACHED_LENGTH まで。既定では最大でおよそ 200MB)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'myblog.cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache.sqlite3',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    'compressed': {
+        'BACKEND': 'myblog.cache.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache-compressed.sqlite3',
+        'OPTIONS': {
+            'MAX_ENTRIES': 200,
+        },
+    },
+}
+
+
+# Admission control
+# 書き込み系ビューへの流入制限(レートは 1 秒あたりの件数)
+# ユーザーごと・全体のレートと同時実行数は共有キャッシュで全ワーカー合計、待ち行列はワーカーごと
+
+ADMISSION_CONTROL = {
+    'VIEWS': ['blog:post_create', 'blog:post_update', 'blog:post_delete'],
+    'USER_RATE': 1.0,
+    'USER_BURST': 5,
+    'GLOBAL_RATE': 20.0,
+    'GLOBAL_BURST': 40,
+    'MAX_IN_FLIGHT': 2,
+    'QUEUE_SIZE': 8,
+    'QUEUE_TIMEOUT': 2.0,
+}
+
+
+# Compression
+# brotli パッケージがあれば br、なければ gzip で圧縮する。レベルを上げるほど CPU を使う
+
+COMPRESSION = {
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    'STREAMING_GZIP_LEVEL': 4,
+    'STREAMING_BROTLI_QUALITY': 3,
+    'STREAMING_FLUSH_SIZE': 64 * 1024,
+    'MIN_LENGTH': 200,
+    'CACHE_TIMEOUT': 60 * 60,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -118,6 +187,23 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+
+# Uploaded images
+# アップロードは常に一時ファイルへチャンクごとに書き出し、メモリに溜めない
+# 派生画像の幅(px)と品質。build_thumbnails コマンドが生成する
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
+MEDIA_URL = '/media/'
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+IMAGE_VARIANT_WIDTHS = [320, 640, 1280]
+
+IMAGE_VARIANT_QUALITY = 80
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -125,3 +211,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
+
+
+# Sitemap
+# build_sitemaps コマンドで生成したシャードの保存先と、1 シャードあたりの URL 数
+
+SITEMAP_ROOT = BASE_DIR / 'sitemaps'
+
+SITEMAP_SHARD_SIZE = 50000
+
+SITEMAP_CHUNK_SIZE = 2000
+
+# build_sitemaps の後に増えた記事を含むインデックスを作り直す間隔(秒)
+SITEMAP_PLAN_TIMEOUT = 5 * 60
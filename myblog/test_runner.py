@@ -0,0 +1,27 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """ テスト中は開発用の cache.sqlite3 を汚さないよう、キャッシュをメモリ上に置く
+
+    流入制限のバケットはキャッシュに残り、テストをまたいで減っていくので、
+    流入制限は ADMISSION_CONTROL を上書きしたテストの中でだけ有効にする。
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_override = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'compressed': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'compressed',
+            },
+        }, ADMISSION_CONTROL={'VIEWS': []})
+        self._cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_override.disable()
+        super().teardown_test_environment(**kwargs)
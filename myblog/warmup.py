@@ -0,0 +1,65 @@
+"""
+Warm-up for WSGI/ASGI workers.
+
+Run once in the master process at application import so that work every
+worker would otherwise repeat on its first requests is done before the
+fork, and the resulting heap is shared copy-on-write between workers.
+"""
+
+import gc
+from pathlib import Path
+
+from django.apps import apps
+from django.contrib.auth.hashers import get_hashers
+from django.db import DatabaseError, connections
+from django.template import engines
+from django.urls import URLResolver, get_resolver
+
+
+def populate_urls(resolver=None):
+    """ URL パターンの正規表現と逆引き表を全て構築する """
+    resolver = resolver or get_resolver()
+    resolver.reverse_dict
+    resolver.namespace_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            populate_urls(pattern)
+
+
+def compile_templates():
+    """ TEMPLATES の DIRS 以下のテンプレートをキャッシュローダーに読み込ませる """
+    count = 0
+    for engine in engines.all():
+        for directory in engine.dirs:
+            root = Path(directory)
+            for path in root.rglob('*.html'):
+                engine.get_template(path.relative_to(root).as_posix())
+                count += 1
+    return count
+
+
+def prime_caches():
+    """ リクエスト中に遅延構築される読み取り専用のキャッシュを埋める """
+    for model in apps.get_models():
+        model._meta.get_fields()
+    get_hashers()
+    try:
+        from django.contrib.contenttypes.models import ContentType
+        ContentType.objects.get_for_models(*apps.get_models())
+    except DatabaseError:
+        # マイグレーション前など、テーブルがなければ各ワーカーで遅延取得させる
+        pass
+    finally:
+        # 接続はフォーク先で共有できないため、ワーカーごとに張り直させる
+        connections.close_all()
+
+
+def warm_up(freeze=True):
+    populate_urls()
+    compile_templates()
+    prime_caches()
+    if freeze:
+        # 以降 GC が走ってもこれらのオブジェクトに触れず、ページのコピーが起きない
+        gc.collect()
+        gc.freeze()